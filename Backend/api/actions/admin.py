@@ -1,18 +1,27 @@
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from api.actions.auth import invalidate_cached_user
 from api.models import AdminCreate, ShowAdmin
 from db.dals import AdminDAL
-from hashing import Hasher
+from hashing import AsyncHasher
 
 
 async def _create_new_admin(body: AdminCreate, session) -> ShowAdmin:
+        hashed_password = await AsyncHasher.get_password_hash(body.password)
         async with session.begin():
             admin_dal = AdminDAL(session)
-            admin = await admin_dal.create_admin(
-                name=body.name,
-                email=body.email,
-                hashed_password=Hasher.get_password_hash(body.password),
-            )
-            return ShowAdmin(
+            try:
+                admin = await admin_dal.create_admin(
+                    name=body.name,
+                    email=body.email,
+                    hashed_password=hashed_password,
+                )
+            except IntegrityError:
+                raise HTTPException(status_code=400, detail="User with this email already exists")
+        invalidate_cached_user(email=admin.email)
+        return ShowAdmin(
             user_id = admin.user_id,
             name = admin.name,
             email = admin.email,
-            )
\ No newline at end of file
+        )
\ No newline at end of file
@@ -7,17 +7,28 @@ from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from db.settings import  SECRET_KEY, ALGORITHM
+from api.cache import TTLCache
+from api.models import AuthUser
+from db.settings import  SECRET_KEY, ALGORITHM, AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_SIZE
 from db.dals import UserDAL
 from db.models import User
 from db.session import get_db
-from hashing import Hasher
+from hashing import AsyncHasher
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/token")
 
 API_KEY_NAME = "Authorization"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
+# Кэш авторизованных пользователей по email, чтобы не ходить в БД на каждый запрос
+auth_user_cache = TTLCache(maxsize=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(email: str = None, user_id: int = None):
+    if email is not None:
+        auth_user_cache.pop(email)
+    if user_id is not None:
+        auth_user_cache.pop_matching(lambda user: user.user_id == user_id)
+
 async def _get_user_by_email_for_auth(email: str, session):
         async with session.begin():
             user_dal = UserDAL(session)
@@ -34,13 +45,18 @@ async def authenticate_user(
         return
     if user.is_active == False:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail= "User not confirmed")
-    if not Hasher.verify_password(password, user.hashed_password):
+    verified, new_hash = await AsyncHasher.verify_and_update(password, user.hashed_password)
+    if not verified:
         return
+    if new_hash is not None:
+        # Параметры bcrypt поменялись — сохраняем пароль с новой стоимостью
+        async with db.begin():
+            await UserDAL(db).update_user(user_id=user.user_id, hashed_password=new_hash)
     return user
 
 async def get_current_user_from_token(
     authorization: str = Security(api_key_header), db: AsyncSession = Depends(get_db)
-):
+) -> AuthUser:
     if not authorization:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
@@ -54,12 +70,25 @@ async def get_current_user_from_token(
             token, SECRET_KEY, algorithms=[ALGORITHM]
         )
         email: str = payload.get("sub")
-        print("username/email extracted is ", email)
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    cached_user = auth_user_cache.get(email)
+    if cached_user is not None:
+        return cached_user
     user = await _get_user_by_email_for_auth(email=email, session=db)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    current_user = AuthUser.from_orm(user)
+    auth_user_cache.set(email, current_user)
+    return current_user
+
+
+async def get_optional_user_from_token(
+    authorization: str = Security(api_key_header), db: AsyncSession = Depends(get_db)
+) -> Union[AuthUser, None]:
+    """Для публичных ручек с личными полями: без заголовка — аноним (None), с неверным токеном — 401."""
+    if not authorization:
+        return None
+    return await get_current_user_from_token(authorization, db)
@@ -1,7 +1,9 @@
-from fastapi import Depends
+from fastapi import Depends, HTTPException
 from sqlalchemy import select
 
-from db.dals import RegistrationDAL
+from api.live_counts import live_counts
+from api.notifications import build_registration_email
+from db.dals import EventDAL, RegistrationDAL, OutboxDAL
 from db.models import Registration
 from db.session import get_db
 
@@ -15,13 +17,30 @@ async def _check_registrate(event_id: int, db=Depends(get_db)):
     existing_registration = result.scalar_one_or_none()
     return existing_registration
 
-# Создание новой регистрации
-async def _create_new_registration(user_id, event_id, session):
+# Создание новой регистрации: место, запись и письмо — в одной транзакции
+async def _create_new_registration(user_id, email: str, event_id, session):
     async with session.begin():
-        registration_dal = RegistrationDAL(session)
-        registration = await registration_dal.create_registration(
-            user_id=user_id,
-            event_id=event_id,
-        )
-        if registration:
-            return {"resp": "Successfully registered"}
+        event_dal = EventDAL(session)
+        event = await event_dal.take_seat(event_id, notify_as=live_counts.instance_id)
+        if event is None:
+            if await event_dal.get_registered_count(event_id) is None:
+                raise HTTPException(status_code=404, detail="Event not found")
+            raise HTTPException(status_code=403, detail="Maximum number of members reached.")
+        registration_id = await RegistrationDAL(session).create_registration(user_id=user_id, event_id=event_id)
+        if registration_id is None:
+            # Исключение откатывает транзакцию вместе с занятым местом
+            raise HTTPException(status_code=400, detail="Already registered for this event")
+        email_subject, email_body = build_registration_email(event)
+        await OutboxDAL(session).enqueue(email, email_subject, email_body)
+    live_counts.publish(event_id, event.registered_count)
+    return {"resp": "Successfully registered"}
+
+# Отмена регистрации с освобождением места
+async def _cancel_registration(user_id, event_id, session) -> bool:
+    async with session.begin():
+        deleted = await RegistrationDAL(session).delete_registration(user_id=user_id, event_id=event_id)
+        if deleted:
+            registered_count = await EventDAL(session).release_seat(event_id, notify_as=live_counts.instance_id)
+    if deleted and registered_count is not None:
+        live_counts.publish(event_id, registered_count)
+    return deleted
@@ -1,31 +1,44 @@
 import secrets
 
-from api.models import UserCreate, ShowUser
-from db.dals import UserDAL
-from db.models import User
-from hashing import Hasher
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from api.actions.auth import invalidate_cached_user
+from api.models import UserCreate, ShowUser, AuthUser
+from confirm_registration import build_confirmation_email
+from db.dals import UserDAL, OutboxDAL
+from hashing import AsyncHasher
 
 
 async def _create_new_user(body: UserCreate, session):
+        hashed_password = await AsyncHasher.get_password_hash(body.password)
         async with session.begin():
             user_dal = UserDAL(session)
-            user = await user_dal.create_user(
-                name=body.name,
-                telegram_id=body.telegram_id,
-                email=body.email,
-                hashed_password=Hasher.get_password_hash(body.password),
-                telephone_number = body.telephone_number,
-                course = body.course,
-                university_group = body.university_group,
-                confirmation_token = secrets.token_hex(16)
-            )
+            try:
+                user = await user_dal.create_user(
+                    name=body.name,
+                    telegram_id=body.telegram_id,
+                    email=body.email,
+                    hashed_password=hashed_password,
+                    telephone_number = body.telephone_number,
+                    course = body.course,
+                    university_group = body.university_group,
+                    confirmation_token = secrets.token_hex(16)
+                )
+            except IntegrityError:
+                # users.email уникален
+                raise HTTPException(status_code=400, detail="User with this email already exists")
+            # Письмо с подтверждением уходит через outbox в той же транзакции
+            subject, text = build_confirmation_email(user.confirmation_token)
+            await OutboxDAL(session).enqueue(user.email, subject, text)
             return user
 
 async def _update_user(updated_user_params: dict, user_id, session):
         async with session.begin():
             user_dal = UserDAL(session)
             updated_user_id = await user_dal.update_user(user_id=user_id, **updated_user_params)
-            return updated_user_id
+        invalidate_cached_user(user_id=user_id)
+        return updated_user_id
 
 async def _get_user_by_id(user_id: int, session) -> ShowUser:
         async with session.begin():
@@ -43,7 +56,7 @@ async def _get_user_by_id(user_id: int, session) -> ShowUser:
                     university_group=user.university_group
                 )
 
-def check_user_permissions(target_user: User) -> bool:
+def check_user_permissions(target_user: AuthUser) -> bool:
     if target_user.role != "admin":
             return False
     return True
\ No newline at end of file
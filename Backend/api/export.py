@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncResult
+
+MEMBER_COLUMNS = ("name", "email", "group", "course", "time_of_registration")
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _row_values(row) -> tuple:
+    name, email, group, course, time_of_registration = row
+    return name, email, group, course, time_of_registration.isoformat() if time_of_registration else None
+
+
+async def csv_chunks(result: AsyncResult) -> AsyncIterator[bytes]:
+    # BOM, чтобы Excel открыл кириллицу в UTF-8
+    buffer = io.StringIO()
+    buffer.write("﻿")
+    writer = csv.writer(buffer)
+    writer.writerow(MEMBER_COLUMNS)
+    async for rows in result.partitions():
+        writer.writerows(_row_values(row) for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def ndjson_chunks(result: AsyncResult) -> AsyncIterator[bytes]:
+    async for rows in result.partitions():
+        yield "".join(
+            json.dumps(dict(zip(MEMBER_COLUMNS, _row_values(row))), ensure_ascii=False) + "\n" for row in rows
+        ).encode()
+
+
+async def export_members(result: AsyncResult, export_format: str) -> AsyncIterator[bytes]:
+    """Пачки строк серверного курсора сразу превращаются в куски ответа; курсор закрывается в конце или при обрыве."""
+    chunks = csv_chunks(result) if export_format == "csv" else ndjson_chunks(result)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await result.close()
@@ -0,0 +1,32 @@
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from sqlalchemy.engine import Row
+from starlette.responses import JSONResponse
+
+
+def _default(value: Any):
+    if isinstance(value, Row):
+        return value._asdict()
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    JSON через orjson без повторной проверки схемы: строки SQLAlchemy становятся объектами
+    по именам колонок, pydantic-модели — через .dict(). datetime пишется в ISO 8601, как у pydantic.
+    """
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Ответ, который FastAPI отдаёт как есть: response_model ручки остаётся только в OpenAPI,
+    поэтому содержимое должно уже совпадать с моделью (см. *_CARD_COLUMNS в db.dals).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
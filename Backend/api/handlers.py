@@ -1,29 +1,38 @@
-from datetime import datetime, timedelta
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Path, Form
-from sqlalchemy import select, true, func, delete, false
+from fastapi import APIRouter, Path, Form, Query
+from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from api.notifications import send_email, send_reminder
-from db.dals import EventDAL
+from api.outbox import outbox_dispatcher
+from api.response_cache import event_response_cache, request_cache_key
+from api.pagination import encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from api.file_response import file_response
+from api.export import export_members, EXPORT_MEDIA_TYPES
+from api.fast_json import FastJSONResponse, dumps
+from api.live_counts import live_counts, DELETED
+from api.image_pipeline import process_image, save_variant_files, InvalidImageError, ORIGINAL_SIZE, \
+    VARIANT_SIZES, VARIANT_FORMATS
+from api.image_store import image_store
+from db.dals import EventDAL, RegistrationDAL, OutboxDAL, UserDAL, ImageDAL, TagDAL
+from db.settings import IMAGE_CACHE_MAX_AGE, EXPORT_CHUNK_SIZE, LIVE_COUNTS_HEARTBEAT_SECONDS, LIVE_COUNTS_MAX_EVENTS
 
 from api.actions.admin import _create_new_admin
-from api.actions.auth import get_current_user_from_token
-from api.actions.events import _archive_event, _update_event
-from api.actions.registrations import _create_new_registration
+from api.actions.auth import get_current_user_from_token, get_optional_user_from_token, auth_user_cache
+from api.actions.events import _archive_event
+from api.actions.registrations import _create_new_registration, _cancel_registration
 from api.actions.user import _create_new_user, _get_user_by_id, _update_user, check_user_permissions
-from confirm_registration import send_confirmation_email
-from db.models import Event, User, Registration, Image
-from db.session import get_db
-from api.models import ShowEvent, EventCard, EventUpdateRequest, UpdateEventResponse, UserCreate, \
-    ShowAdmin, AdminCreate, UserCard, UpdateUserResponse, UserUpdateRequest, ShowRegistrationUser, ShowEventInUserCab, \
-    UserInfoInCab
-from fastapi.responses import StreamingResponse
-from io import BytesIO
-from fastapi import File, UploadFile, HTTPException, Depends
-from PIL import Image as PillowImage
+from db.models import Event, User, Registration
+from db.session import get_db, async_session, async_read_session
+from api.read_routing import get_read_db, is_pinned
+from api.query_budget import query_budget
+from api.models import ShowEvent, EventUpdateRequest, UpdateEventResponse, UserCreate, \
+    ShowAdmin, AdminCreate, UpdateUserResponse, UserUpdateRequest, ShowRegistrationUser, ShowEventInUserCab, \
+    UserInfoInCab, EventCardPage, UserCardPage, AuthUser, TagFacets, EventSeatStatus, \
+    UserCabinet
+from fastapi import File, UploadFile, HTTPException, Depends, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 
 event_router = APIRouter()
 user_router = APIRouter()
@@ -33,8 +42,6 @@ images_router = APIRouter()
 
 archiving_router = APIRouter()
 
-scheduler = AsyncIOScheduler()
-
 @event_router.post("/events")
 async def create_event_with_image(
     event_name: str = Form(...),
@@ -48,7 +55,7 @@ async def create_event_with_image(
     tags: str = Form(...),
     file: UploadFile = File(None),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token)):
+    current_user: AuthUser = Depends(get_current_user_from_token)):
 
     if not check_user_permissions(current_user):
         raise HTTPException(status_code=403, detail="Forbidden.")
@@ -66,6 +73,8 @@ async def create_event_with_image(
         online_event_link=online_event_link,
         tags=tags
         )
+        await TagDAL(db).set_event_tags(event.event_id, tags)
+    event_response_cache.invalidate(event.event_id)
 
     if file:
         if not file.content_type.startswith("image/"):
@@ -73,46 +82,138 @@ async def create_event_with_image(
 
         file_data = await file.read()
 
+        # Картинка декодируется один раз в пуле процессов и сразу пережимается во все варианты
         try:
-            img = PillowImage.open(BytesIO(file_data))
-
-            width, height = img.size
-
-            if width != height:
-                raise HTTPException(status_code=400, detail="The image must be square.")
-
+            processed = await process_image(file_data)
+        except InvalidImageError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error processing the image: {str(e)}")
 
-        new_image = Image(event_id=event.event_id, data=file_data)
-        db.add(new_image)
-        await db.commit()
-        await db.refresh(new_image)
+        # Файлы кладём на диск под их хешами, в БД сохраняем только метаданные
+        digest = await run_in_threadpool(image_store.save, file_data)
+        variants = await run_in_threadpool(save_variant_files, processed)
+        async with db.begin():
+            image_dal = ImageDAL(db)
+            image = await image_dal.create_image(event_id=event.event_id, sha256=digest,
+                                                 content_type=processed.content_type, size=len(file_data))
+            await image_dal.create_variants(image.id, variants)
 
-    schedule_event_reminder(event.event_id, event.date)
     return {
         "message": "Event created successfully.",
         "event_id": event.event_id,
         "image_uploaded": bool(file),
     }
 
-@event_router.get("/events", response_model=List[EventCard])
-async def show_all_active_events(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Event).where(Event.is_active == true()))
-    events = result.scalars().all()
-    return events
+async def _events_page(db: AsyncSession, is_active: bool, descending: bool, cursor: Optional[str], limit: int,
+                       date_from: Optional[datetime], date_to: Optional[datetime], format: Optional[str],
+                       tags: Optional[List[str]]) -> dict:
+    """Страница в форме EventCardPage из словарей карточек, без pydantic; счётчики добавляет _with_seat_statuses."""
+    after = tuple(decode_cursor(cursor, datetime, int)) if cursor else None
+    events = await EventDAL(db).list_events(
+        is_active=is_active, limit=limit + 1, after=after, descending=descending,
+        date_from=date_from, date_to=date_to, format=format, tags=tags,
+    )
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = encode_cursor(events[-1].date, events[-1].event_id)
+    return {"items": [event._asdict() for event in events], "next_cursor": next_cursor}
+
+async def _seat_statuses(db: AsyncSession, event_ids: List[int], user: Optional[AuthUser]) -> List[dict]:
+    """Данные в форме EventSeatStatus одним запросом на весь набор мероприятий."""
+    if not event_ids:
+        return []
+    rows = await EventDAL(db).get_seat_statuses(event_ids, user.user_id if user is not None else None)
+    return [
+        {
+            "event_id": event_id,
+            "registered_count": registered_count,
+            "seats_remaining": max(max_count - registered_count, 0) if max_count is not None else None,
+            "registered_by_me": registered_by_me,
+        }
+        for event_id, registered_count, max_count, registered_by_me in rows
+    ]
+
+def _seat_stamp(user: Optional[AuthUser]) -> Optional[str]:
+    """Метка для serve_overlaid: от неё зависит overlay _with_seat_statuses."""
+    version = live_counts.seat_version()
+    if version is None:
+        return None
+    return f"{user.user_id if user is not None else ''}:{version}"
+
+def _with_seat_statuses(db: AsyncSession, user: Optional[AuthUser]):
+    """
+    Overlay для кэшированной страницы карточек: счётчики и запись пользователя меняются чаще,
+    чем сами мероприятия, поэтому не кэшируются, а читаются на каждый запрос одним запросом.
+    """
+    async def overlay(page: dict) -> dict:
+        statuses = {status["event_id"]: status
+                    for status in await _seat_statuses(db, [card["event_id"] for card in page["items"]], user)}
+        return {**page, "items": [{**card, **statuses.get(card["event_id"], {})} for card in page["items"]]}
+
+    return overlay
+
+@event_router.get("/events", response_model=EventCardPage)
+# Страница при промахе кэша, счётчики и запись пользователя, пользователь при промахе кэша авторизации
+@query_budget(3)
+async def show_all_active_events(request: Request, cursor: Optional[str] = None,
+                                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                 date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                                 format: Optional[str] = None, tags: Optional[List[str]] = Query(None),
+                                 db: AsyncSession = Depends(get_read_db),
+                                 current_user: Optional[AuthUser] = Depends(get_optional_user_from_token)):
+    # Ближайшие мероприятия идут первыми
+    return await event_response_cache.serve_overlaid(
+        request, request_cache_key("events", request),
+        lambda: _events_page(db, True, False, cursor, limit, date_from, date_to, format, tags),
+        _with_seat_statuses(db, current_user),
+        fresh=is_pinned(request), stamp=_seat_stamp(current_user),
+    )
+
+async def _search_page(db: AsyncSession, q: str, cursor: Optional[str], limit: int) -> dict:
+    after = tuple(decode_cursor(cursor, float, int)) if cursor else None
+    rows = await EventDAL(db).search_events(q, limit=limit + 1, after=after)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].event_id)
+    items = [row._asdict() for row in rows]
+    for item in items:
+        del item["rank"]
+    return {"items": items, "next_cursor": next_cursor}
+
+# Объявлена до /events/{event_id}, иначе "search" разбирался бы как event_id
+@event_router.get("/events/search", response_model=EventCardPage)
+@query_budget(3)
+async def search_events(request: Request, q: str = Query(..., min_length=1, max_length=200),
+                        cursor: Optional[str] = None,
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        db: AsyncSession = Depends(get_read_db),
+                        current_user: Optional[AuthUser] = Depends(get_optional_user_from_token)):
+    # Синтаксис запроса как в поисковиках: слова, "фраза", -исключение, or
+    return await event_response_cache.serve_overlaid(
+        request, request_cache_key("search", request),
+        lambda: _search_page(db, q, cursor, limit),
+        _with_seat_statuses(db, current_user),
+        fresh=is_pinned(request), stamp=_seat_stamp(current_user),
+    )
 
 @event_router.get("/events/{event_id}", response_model=ShowEvent)
-async def show_event(event_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Event).where(Event.event_id == event_id))
-    event = result.scalars().first()
-    if not event:
-        raise HTTPException(status_code=404, detail=f"Event with ID {event_id} not found")
-    return event
+@query_budget(1)
+async def show_event(event_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    async def build():
+        event = await EventDAL(db).get_event_by_id(event_id)
+        if not event:
+            raise HTTPException(status_code=404, detail=f"Event with ID {event_id} not found")
+        return ShowEvent.from_orm(event)
+
+    return await event_response_cache.serve(request, ("event", event_id), build, event_id=event_id,
+                                            fresh=is_pinned(request))
 
 @event_router.patch("/archive_events/{event_id}")
 async def archive_event(event_id: int, db: AsyncSession = Depends(get_db),
-                        current_user: User = Depends(get_current_user_from_token)):
+                        current_user: AuthUser = Depends(get_current_user_from_token)):
     if not check_user_permissions(
         current_user
     ):
@@ -120,11 +221,12 @@ async def archive_event(event_id: int, db: AsyncSession = Depends(get_db),
     archived_event = await _archive_event(event_id, db)
     if archived_event is None:
         raise HTTPException(status_code=404, detail=f"Event with id: {event_id} not found or already archived")
+    event_response_cache.invalidate(event_id)
     return f"{archived_event} event was archived"
 
 @event_router.patch("/events/{event_id}", response_model=UpdateEventResponse,)
 async def update_event_by_id(event_id: int, body: EventUpdateRequest, db: AsyncSession = Depends(get_db),
-                             current_user: User = Depends(get_current_user_from_token)) -> UpdateEventResponse:
+                             current_user: AuthUser = Depends(get_current_user_from_token)) -> UpdateEventResponse:
     if not check_user_permissions(
         current_user
     ):
@@ -132,36 +234,36 @@ async def update_event_by_id(event_id: int, body: EventUpdateRequest, db: AsyncS
     updated_event_params = body.dict(exclude_none=True)
     if updated_event_params == {}:
         raise HTTPException(status_code=422, detail=f"At least one parameter for event update should be provided")
-    updated_event_id = await _update_event(updated_event_params=updated_event_params, session=db, event_id=event_id)
-    result = await db.execute(
-        select(Registration)
-        .join(User, Registration.user_id == User.user_id)
-        .where(Registration.event_id == event_id)
-        .options(joinedload(Registration.user))
-    )
-    registrations = result.scalars().all()
-
-    emails = [reg.user.email for reg in registrations]
-
-    event_result = await db.execute(select(Event).where(Event.event_id == event_id))
-    event = event_result.scalar_one_or_none()
-
-    subject = f"Изменения в мероприятии: {event.event_name}"
-    body = (
-        "Дорогой участник мероприятий ITAM,\n\n"
-        f"Мероприятие {event.event_name} было изменено.\n\n"
-        "Просим обратить внимание на изменения, будем ждать вас на мероприятии!\n\n"
-        "С наилучшими пожеланиями,\n"
-        "Команда ITAM"
-    )
-
-    for email in emails:
-        await send_email(email, subject, body)
+    if "date" in updated_event_params:
+        # Новая дата — напоминание должно уйти заново
+        updated_event_params["reminder_sent_at"] = None
+    async with db.begin():
+        event_dal = EventDAL(db)
+        updated_event_id = await event_dal.update_event(event_id=event_id, **updated_event_params)
+        if updated_event_id is None:
+            raise HTTPException(status_code=404, detail=f"Event with id: {event_id} not found")
+        if "tags" in updated_event_params:
+            await TagDAL(db).set_event_tags(event_id, updated_event_params["tags"])
+        event = await event_dal.get_event_by_id(event_id)
+        emails = await RegistrationDAL(db).get_member_emails(event_id)
+
+        subject = f"Изменения в мероприятии: {event.event_name}"
+        body = (
+            "Дорогой участник мероприятий ITAM,\n\n"
+            f"Мероприятие {event.event_name} было изменено.\n\n"
+            "Просим обратить внимание на изменения, будем ждать вас на мероприятии!\n\n"
+            "С наилучшими пожеланиями,\n"
+            "Команда ITAM"
+        )
+        await OutboxDAL(db).enqueue_many(emails, subject, body)
+    event_response_cache.invalidate(event_id)
+    outbox_dispatcher.wake()
     return UpdateEventResponse(updated_event_id = updated_event_id)
 
 @event_router.get("/event_members/{event_id}", response_model=List[ShowRegistrationUser])
-async def show_members_on_event(event_id: int = Path(..., gt=0), db: AsyncSession = Depends(get_db),
-                                current_user: User = Depends(get_current_user_from_token)):
+@query_budget(2)
+async def show_members_on_event(event_id: int = Path(..., gt=0), db: AsyncSession = Depends(get_read_db),
+                                current_user: AuthUser = Depends(get_current_user_from_token)):
     if not check_user_permissions(
         current_user
     ):
@@ -181,99 +283,174 @@ async def show_members_on_event(event_id: int = Path(..., gt=0), db: AsyncSessio
 
     return members_info
 
+@event_router.get("/event_members/{event_id}/export")
+@query_budget(3)
+async def export_members_on_event(event_id: int = Path(..., gt=0),
+                                  format: str = Query("csv", regex="^(csv|ndjson)$"),
+                                  db: AsyncSession = Depends(get_read_db),
+                                  current_user: AuthUser = Depends(get_current_user_from_token)):
+    """
+    Выгрузка участников в CSV или NDJSON потоком: строки читаются серверным курсором пачками
+    по EXPORT_CHUNK_SIZE и сразу уходят клиенту, так что память не растёт с размером мероприятия.
+    """
+    if not check_user_permissions(current_user):
+        raise HTTPException(status_code=403, detail="Forbidden.")
+    if await EventDAL(db).get_event_by_id(event_id) is None:
+        raise HTTPException(status_code=404, detail=f"Event with id: {event_id} not found")
+    result = await RegistrationDAL(db).stream_members(event_id, EXPORT_CHUNK_SIZE)
+    # Сессия из зависимости закрывается уже после отправки ответа, курсор живёт до конца выгрузки
+    return StreamingResponse(
+        export_members(result, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="event_{event_id}_members.{format}"'},
+    )
+
+@event_router.get("/tags", response_model=TagFacets)
+@query_budget(1)
+async def show_tag_facets(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Теги с числом активных мероприятий для фильтра ленты (/events?tags=...)."""
+    async def build():
+        counts = await TagDAL(db).get_active_tag_counts()
+        return TagFacets(items=[{"name": name, "count": count} for name, count in counts])
+
+    return await event_response_cache.serve(request, ("tags",), build, fresh=is_pinned(request))
+
+def _sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+@event_router.get("/live_counts")
+async def stream_registration_counts(request: Request, event_ids: List[int] = Query(...)):
+    """
+    Server-Sent Events со счётчиками регистраций вместо опроса /count_members: сначала текущие
+    значения, затем каждое изменение (event: count), удаление мероприятия (event: deleted)
+    и пинг-комментарий раз в LIVE_COUNTS_HEARTBEAT_SECONDS, чтобы прокси не закрывали соединение.
+    """
+    event_ids = sorted(set(event_ids))
+    if len(event_ids) > LIVE_COUNTS_MAX_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {LIVE_COUNTS_MAX_EVENTS} events per stream")
+    session_factory = async_session if is_pinned(request) else async_read_session
+
+    async def stream():
+        # Подписка до чтения снимка: изменение между ними придёт следом и не потеряется
+        with live_counts.subscribe(event_ids) as subscription:
+            # Своя короткая сессия: соединение с базой не держится, пока поток открыт
+            async with session_factory() as session:
+                counts = await EventDAL(session).get_registered_counts(event_ids)
+            for event_id, registered_count in counts:
+                yield _sse("count", {"event_id": event_id, "registered_count": registered_count})
+            while True:
+                changes = await subscription.changes(LIVE_COUNTS_HEARTBEAT_SECONDS)
+                if not changes:
+                    yield b": ping\n\n"
+                for event_id, registered_count in changes.items():
+                    if registered_count is DELETED:
+                        yield _sse("deleted", {"event_id": event_id})
+                    else:
+                        yield _sse("count", {"event_id": event_id, "registered_count": registered_count})
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @event_router.get("/count_members/{event_id}")
-async def count_events(event_id: int, db: AsyncSession = Depends(get_db)):
-    query = select(func.count()).select_from(Registration).where(Registration.event_id == event_id)
-    result = await db.execute(query)
-    counter = result.scalar_one()
-    return counter
+@query_budget(1)
+async def count_events(event_id: int, db: AsyncSession = Depends(get_read_db)):
+    # Счётчик хранится в строке мероприятия, count(*) по registrations не нужен
+    counter = await EventDAL(db).get_registered_count(event_id)
+    return counter or 0
 
 @event_router.delete("/delete_event/{event_id}")
 async def delete_event(event_id: int, db: AsyncSession = Depends(get_db),
-                       current_user: User = Depends(get_current_user_from_token)):
+                       current_user: AuthUser = Depends(get_current_user_from_token)):
     if not check_user_permissions(
         current_user
     ):
         raise HTTPException(status_code=403, detail="Forbidden.")
-    result = await db.execute(
-        select(Registration)
-        .join(User, Registration.user_id == User.user_id)
-        .where(Registration.event_id == event_id)
-        .options(joinedload(Registration.user))
-    )
-    registrations = result.scalars().all()
-
-    emails = [reg.user.email for reg in registrations]
-
-    event_result = await db.execute(select(Event).where(Event.event_id == event_id))
-    event = event_result.scalar_one_or_none()
-
-    subject = f"Изменения в мероприятии: {event.event_name}"
-    body = (
-        "Дорогой участник мероприятий ITAM,\n\n"
-        f"К сожалению, мероприятие {event.event_name} было отменено.\n\n"
-        "Приносим извинения за предоставленные неудобства, ждем вас на других мероприятиях!\n\n"
-        "С наилучшими пожеланиями,\n"
-        "Команда ITAM"
-    )
-
-    # Отправляем уведомления каждому участнику
-    for email in emails:
-        await send_email(email, subject, body)
-
-    stmt_image = delete(Image).where(
-        Image.event_id == event_id,
-    )
-    await db.execute(stmt_image)
+    async with db.begin():
+        # Блокируем мероприятие, чтобы параллельная регистрация не успела добавить запись
+        event = await EventDAL(db).get_event_by_id(event_id, for_update=True)
+        if event is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        emails = await RegistrationDAL(db).get_member_emails(event_id)
+
+        subject = f"Изменения в мероприятии: {event.event_name}"
+        body = (
+            "Дорогой участник мероприятий ITAM,\n\n"
+            f"К сожалению, мероприятие {event.event_name} было отменено.\n\n"
+            "Приносим извинения за предоставленные неудобства, ждем вас на других мероприятиях!\n\n"
+            "С наилучшими пожеланиями,\n"
+            "Команда ITAM"
+        )
+        # Уведомления участникам попадают в outbox вместе с удалением мероприятия
+        await OutboxDAL(db).enqueue_many(emails, subject, body)
 
-    stmt_registration = delete(Registration).where(
-        Registration.event_id == event_id,
-    )
-    await db.execute(stmt_registration)
+        image_hashes = await ImageDAL(db).delete_event_images(event_id)
 
-    stmt_event = delete(Event).where(
-        Event.event_id == event_id,
-    )
-    result_event = await db.execute(stmt_event)
+        stmt_registration = delete(Registration).where(
+            Registration.event_id == event_id,
+        )
+        await db.execute(stmt_registration)
 
-    await db.commit()
+        stmt_event = delete(Event).where(
+            Event.event_id == event_id,
+        )
+        await db.execute(stmt_event)
+        await live_counts.notify_deleted(db, event_id)
+    event_response_cache.invalidate(event_id)
+    live_counts.publish(event_id, DELETED)
+    outbox_dispatcher.wake()
 
-    if result_event.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Event not found")
+    # Один и тот же файл может принадлежать нескольким мероприятиям, удаляем только неиспользуемые
+    async with db.begin():
+        still_referenced = await ImageDAL(db).get_referenced_hashes(image_hashes)
+    for digest in set(image_hashes) - still_referenced:
+        await run_in_threadpool(image_store.delete, digest)
     return {"message": f"You deleted {event_id} event"}
 
-@event_router.get("/archived_events", response_model=List[EventCard])
-async def show_all_archived_events(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Event).where(Event.is_active == false()))
-    events = result.scalars().all()
-    return events
+@event_router.get("/archived_events", response_model=EventCardPage)
+@query_budget(3)
+async def show_all_archived_events(request: Request, cursor: Optional[str] = None,
+                                   limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                   date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                                   format: Optional[str] = None, tags: Optional[List[str]] = Query(None),
+                                   db: AsyncSession = Depends(get_read_db),
+                                   current_user: Optional[AuthUser] = Depends(get_optional_user_from_token)):
+    # Архив показываем от недавних мероприятий к старым
+    return await event_response_cache.serve_overlaid(
+        request, request_cache_key("archived_events", request),
+        lambda: _events_page(db, False, True, cursor, limit, date_from, date_to, format, tags),
+        _with_seat_statuses(db, current_user),
+        fresh=is_pinned(request), stamp=_seat_stamp(current_user),
+    )
 
 @user_router.post("/create_user")
 async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db)):
-    new_user = await _create_new_user(body, db)
-    await send_confirmation_email(new_user.email, new_user.confirmation_token)
+    await _create_new_user(body, db)
+    outbox_dispatcher.wake()
     return {"message": "Registration successful, please confirm your email"}
 
 #Вспомогательная ручка
-@user_router.get("/all_users", response_model=List[UserCard])
-async def show_all_users(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User))
-    users = result.scalars().all()
-    return users
+@user_router.get("/all_users", response_model=UserCardPage)
+async def show_all_users(cursor: Optional[str] = None,
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                         db: AsyncSession = Depends(get_read_db)):
+    after_id = decode_cursor(cursor, int)[0] if cursor else None
+    users = await UserDAL(db).list_users(limit=limit + 1, after_id=after_id)
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].user_id)
+    return FastJSONResponse({"items": users, "next_cursor": next_cursor})
 
 @user_router.get("/users_info", response_model=UserInfoInCab)
-async def show_user_info(db: AsyncSession = Depends(get_db),
-                         current_user: User = Depends(get_current_user_from_token)):
-    result = await db.execute(select(User).where(User.user_id == current_user.user_id))
-    user = result.scalars().first()
-    if not user:
-        raise HTTPException(status_code=404, detail=f"User not found")
-    return user
+@query_budget(1)
+async def show_user_info(current_user: AuthUser = Depends(get_current_user_from_token)):
+    # Профиль уже загружен зависимостью авторизации; изменения профиля сбрасывают её кэш
+    return current_user
 
 
 @user_router.patch("/users", response_model=UpdateUserResponse)
 async def update_user_by_id(body: UserUpdateRequest, db: AsyncSession = Depends(get_db),
-                            current_user: User = Depends(get_current_user_from_token)):
+                            current_user: AuthUser = Depends(get_current_user_from_token)):
     user_id = current_user.user_id
     updated_user_params = body.dict(exclude_none=True)
     if updated_user_params == {}:
@@ -285,47 +462,54 @@ async def update_user_by_id(body: UserUpdateRequest, db: AsyncSession = Depends(
     return UpdateUserResponse(updated_user_id = updated_user_id)
 
 @user_router.get("/user_events", response_model=List[ShowEventInUserCab])
-async def show_user_events(db: AsyncSession = Depends(get_db),
-                           current_user: User = Depends(get_current_user_from_token)):
-    user_id = current_user.user_id
-    query = (
-        select(Event.event_id, Event.event_name, Event.date)
-        .join(Registration, Event.event_id == Registration.event_id)
-        .join(User, User.user_id == Registration.user_id)
-        .where(User.user_id == user_id)
-    )
-    result = await db.execute(query)
-    events = result.all()
-
-    events_info = [ShowEventInUserCab(event_id = event_id, event_name=event_name, date=date) for event_id, event_name, date in events]
-
-    return events_info
+@query_budget(2)
+async def show_user_events(db: AsyncSession = Depends(get_read_db),
+                           current_user: AuthUser = Depends(get_current_user_from_token)):
+    events = await RegistrationDAL(db).get_user_events(current_user.user_id)
+    return FastJSONResponse([{"event_id": event_id, "event_name": event_name, "date": date}
+                             for event_id, event_name, date, _ in events])
 
 @user_router.get("/user_completed_events", response_model=List[ShowEventInUserCab])
-async def show_user_completed_events(db: AsyncSession = Depends(get_db),
-                           current_user: User = Depends(get_current_user_from_token)):
-    user_id = current_user.user_id
-    query = (
-        select(Event.event_id,Event.event_name, Event.date)
-        .join(Registration, Event.event_id == Registration.event_id)
-        .join(User, User.user_id == Registration.user_id)
-        .where(User.user_id == user_id, Event.is_active == False)
-    )
-    result = await db.execute(query)
-    events = result.all()
-
-    events_info = [ShowEventInUserCab(event_id = event_id, event_name=event_name, date=date) for event_id, event_name, date in events]
-
-    return events_info
+@query_budget(2)
+async def show_user_completed_events(db: AsyncSession = Depends(get_read_db),
+                           current_user: AuthUser = Depends(get_current_user_from_token)):
+    events = await RegistrationDAL(db).get_user_events(current_user.user_id, is_active=False)
+    return FastJSONResponse([{"event_id": event_id, "event_name": event_name, "date": date}
+                             for event_id, event_name, date, _ in events])
+
+@user_router.get("/cabinet", response_model=UserCabinet)
+# Пользователь при промахе кэша авторизации и все его мероприятия одним запросом
+@query_budget(2)
+async def show_user_cabinet(db: AsyncSession = Depends(get_read_db),
+                            current_user: AuthUser = Depends(get_current_user_from_token)):
+    """
+    Всё для личного кабинета за один запрос вместо /users_info, /user_role, /user_events и
+    /user_completed_events: профиль берётся из авторизованного пользователя, а мероприятия
+    делятся на предстоящие и завершённые по is_active.
+    """
+    upcoming_events, completed_events = [], []
+    for event_id, event_name, date, is_active in await RegistrationDAL(db).get_user_events(current_user.user_id):
+        (upcoming_events if is_active else completed_events).append(
+            {"event_id": event_id, "event_name": event_name, "date": date}
+        )
+    # Завершённые — от недавних к старым
+    completed_events.reverse()
+    return FastJSONResponse({
+        "profile": current_user.dict(include=set(UserInfoInCab.__fields__)),
+        "role": current_user.role,
+        "upcoming_events": upcoming_events,
+        "completed_events": completed_events,
+    })
 
 @user_router.get("/user_role")
-async def user_role(current_user: User = Depends(get_current_user_from_token)):
+async def user_role(current_user: AuthUser = Depends(get_current_user_from_token)):
     user_role = current_user.role
     return user_role
 
 @user_router.get("/check_user_registration")
-async def check_registrate(event_id: int,  db: AsyncSession = Depends(get_db),
-                           current_user: User = Depends(get_current_user_from_token)):
+@query_budget(2)
+async def check_registrate(event_id: int,  db: AsyncSession = Depends(get_read_db),
+                           current_user: AuthUser = Depends(get_current_user_from_token)):
     stmt = select(Registration).where(Registration.event_id == event_id, Registration.user_id == current_user.user_id)
     result = await db.execute(stmt)
     reg = result.scalar_one_or_none()
@@ -339,84 +523,69 @@ async def check_registrate(event_id: int,  db: AsyncSession = Depends(get_db),
 async def create_admin(body: AdminCreate, db: AsyncSession = Depends(get_db)):
     return await _create_new_admin(body, db)
 
+@admin_router.get("/cache_stats")
+async def show_cache_stats(current_user: AuthUser = Depends(get_current_user_from_token)):
+    if not check_user_permissions(current_user):
+        raise HTTPException(status_code=403, detail="Forbidden.")
+    return {"auth_users": auth_user_cache.stats(), "event_responses": event_response_cache.stats()}
+
+
+@registration.get("/registration_status", response_model=List[EventSeatStatus])
+# Пользователь при промахе кэша авторизации и статусы всех мероприятий
+@query_budget(2)
+async def show_registration_statuses(request: Request, event_ids: List[int] = Query(...),
+                                     db: AsyncSession = Depends(get_read_db),
+                                     current_user: Optional[AuthUser] = Depends(get_optional_user_from_token)):
+    """Пакетная замена /count_members и /check_user_registration для набора карточек."""
+    event_ids = sorted(set(event_ids))
+    if len(event_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} events per request")
+    return FastJSONResponse(await _seat_statuses(db, event_ids, current_user))
 
 @registration.post("/add_member")
+# Пользователь (при промахе кэша авторизации), место, регистрация и письмо в outbox
+@query_budget(4)
 async def create_registration(event_id: int, db: AsyncSession = Depends(get_db),
-                              current_user: User = Depends(get_current_user_from_token)):
-    stmt = select(Event).where(Event.event_id == event_id)
-    result = await db.execute(stmt)
-    event = result.scalar_one_or_none()
-    stmt1 = select(Registration).where(Registration.event_id == event_id, Registration.user_id == current_user.user_id)
-    result1 = await db.execute(stmt1)
-    reg = result1.scalar_one_or_none()
-    await db.commit()
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    if await count_events(event_id, db) >= event.max_count_of_members:
-        raise HTTPException(status_code=403, detail="Maximum number of members reached.")
-    await db.commit()
-    if reg:
-        raise HTTPException(status_code=400, detail="Already registered for this event")
-    email_subject = f"Уведомление о регистрации на мероприятие {event.event_name}"
-    email_body = (
-        f"Уважаемый участник мероприятий ITAM,\n\n"
-        f"Вы были успешно зарегистрированы на мероприятие: {event.event_name}.\n\n"
-        f"Подробности данного мероприятия:\n"
-        f"- Описание: {event.long_description}\n"
-        f"- Дата проведения: {event.date}\n"
-        f"- Место проведения: {event.place}\n\n"
-        f"Будем рады видеть вас!\n\n"
-        f"С наилучшими пожеланиями,\n"
-        f"Команда ITAM"
-    )
-    await send_email(current_user.email, email_subject, email_body)
-    return await _create_new_registration(current_user.user_id, event_id, db)
+                              current_user: AuthUser = Depends(get_current_user_from_token)):
+    response = await _create_new_registration(current_user.user_id, current_user.email, event_id, db)
+    outbox_dispatcher.wake()
+    return response
 
 
 @registration.delete("/cancel_registration")
-async def delete_event(event_id: int, db: AsyncSession = Depends(get_db),
-                       current_user: User = Depends(get_current_user_from_token)):
-    stmt = delete(Registration).where(
-        Registration.event_id == event_id,
-        Registration.user_id == current_user.user_id,
-    )
-    result = await db.execute(stmt)
-    await db.commit()
-
-    if result.rowcount == 0:
+@query_budget(3)
+async def cancel_registration(event_id: int, db: AsyncSession = Depends(get_db),
+                              current_user: AuthUser = Depends(get_current_user_from_token)):
+    canceled = await _cancel_registration(current_user.user_id, event_id, db)
+    if not canceled:
         raise HTTPException(status_code=404, detail="Registration not found")
 
     return {"message": f"You canceled registration"}
 
 
 @images_router.get("/show_event_image/{event_id}")
-async def download_image(event_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Image).where(Image.event_id == event_id))
-    image = result.scalars().first()
-    if not image:
+@query_budget(2)
+async def download_image(event_id: int, request: Request,
+                         size: str = Query(ORIGINAL_SIZE, regex=f"^({'|'.join([ORIGINAL_SIZE, *VARIANT_SIZES])})$"),
+                         format: Optional[str] = Query(None, regex=f"^({'|'.join(VARIANT_FORMATS)})$"),
+                         db: AsyncSession = Depends(get_read_db)):
+    image_dal = ImageDAL(db)
+    negotiated = format is None
+    if negotiated:
+        format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+
+    variant = None
+    if size != ORIGINAL_SIZE:
+        variant = await image_dal.get_variant(event_id, size, format)
+    if variant is None:
+        # Оригинал, либо картинка загружена до появления вариантов
+        variant = await image_dal.get_image_by_event_id(event_id)
+        negotiated = False
+    if not variant:
         raise HTTPException(status_code=404, detail="Image not found")
 
-    image_stream = BytesIO(image.data)
-    return StreamingResponse(image_stream, media_type="image/jpeg")
-
-def schedule_event_reminder(event_id: int, event_date: datetime):
-    """
-    Планирует задачу отправки напоминания за 24 часа до начала мероприятия.
-    """
-    reminder_time = event_date - timedelta(hours=24)
-    if reminder_time > datetime.now():
-        scheduler.add_job(
-            send_reminder,
-            "date",
-            run_date=reminder_time,
-            args=[event_id],
-            id=f"event_{event_id}_reminder",
-        )
-        print(f"Reminder scheduled for event {event_id} at {reminder_time}.")
-    else:
-        print(f"Event {event_id} is too close to schedule a reminder.")
-
-# Запуск планировщика при старте приложения
-@user_router.on_event("startup")
-async def start_scheduler():
-    scheduler.start()
\ No newline at end of file
+    response = await file_response(request, str(image_store.path_for(variant.sha256)), variant.content_type,
+                                   etag=variant.sha256, max_age=IMAGE_CACHE_MAX_AGE)
+    if negotiated:
+        response.headers["vary"] = "Accept"
+    return response
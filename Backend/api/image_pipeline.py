@@ -0,0 +1,109 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import List
+
+from PIL import Image as PillowImage, ImageOps, UnidentifiedImageError
+
+from api.image_store import image_store
+from db.settings import IMAGE_WORKERS
+
+# Размеры производных картинок: максимальная сторона в пикселях
+VARIANT_SIZES = {
+    "card": 480,
+    "detail": 1200,
+}
+# Формат -> (формат Pillow, content type, параметры кодирования); jpeg — запасной вариант для старых браузеров
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+ORIGINAL_SIZE = "original"
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+@dataclass
+class RenderedVariant:
+    size: str
+    format: str
+    content_type: str
+    width: int
+    height: int
+    data: bytes
+
+
+@dataclass
+class ProcessedImage:
+    content_type: str
+    width: int
+    height: int
+    variants: List[RenderedVariant] = field(default_factory=list)
+
+
+def _flatten(img: PillowImage.Image) -> PillowImage.Image:
+    """JPEG не умеет прозрачность, поэтому подкладываем белый фон."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = PillowImage.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def render_variants(data: bytes) -> ProcessedImage:
+    """Выполняется в отдельном процессе: картинка декодируется один раз и пережимается во все варианты."""
+    try:
+        img = PillowImage.open(BytesIO(data))
+        img.load()
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImageError("Uploaded file is not an image")
+
+    content_type = PillowImage.MIME.get(img.format, "application/octet-stream")
+    img = ImageOps.exif_transpose(img)
+    width, height = img.size
+    if width != height:
+        raise InvalidImageError("The image must be square.")
+
+    processed = ProcessedImage(content_type=content_type, width=width, height=height)
+    for size, max_side in VARIANT_SIZES.items():
+        resized = img.copy()
+        # thumbnail не увеличивает маленькие картинки
+        resized.thumbnail((max_side, max_side), PillowImage.LANCZOS)
+        sources = {"webp": resized if resized.mode in ("RGB", "RGBA") else resized.convert("RGBA"),
+                   "jpeg": _flatten(resized)}
+        for format, (pillow_format, variant_content_type, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            sources[format].save(buffer, pillow_format, **options)
+            processed.variants.append(RenderedVariant(
+                size=size, format=format, content_type=variant_content_type,
+                width=resized.width, height=resized.height, data=buffer.getvalue(),
+            ))
+    return processed
+
+
+image_process_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+
+
+async def process_image(data: bytes) -> ProcessedImage:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(image_process_pool, render_variants, data)
+
+
+def save_variant_files(processed: ProcessedImage) -> List[dict]:
+    """Кладёт файлы вариантов в хранилище и возвращает строки для таблицы image_variants."""
+    return [
+        {
+            "size": variant.size,
+            "format": variant.format,
+            "sha256": image_store.save(variant.data),
+            "content_type": variant.content_type,
+            "width": variant.width,
+            "height": variant.height,
+            "size_bytes": len(variant.data),
+        }
+        for variant in processed.variants
+    ]
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from db.settings import IMAGE_STORE_DIR
+
+
+class ImageStore:
+    """
+    Хранилище картинок на диске с адресацией по содержимому: файл лежит по своему sha256,
+    поэтому одинаковые загрузки занимают место один раз, а записанный файл никогда не меняется.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def save(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if path.exists():
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Пишем во временный файл рядом и атомарно переименовываем, чтобы не отдать недописанный файл
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest
+
+    def delete(self, digest: str):
+        try:
+            self.path_for(digest).unlink()
+        except FileNotFoundError:
+            pass
+
+
+image_store = ImageStore(IMAGE_STORE_DIR)
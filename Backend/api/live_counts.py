@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import logging
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+from sqlalchemy import select, func
+
+from api.metrics import LIVE_COUNT_STREAMS, LIVE_COUNT_UPDATES
+from db.session import engine
+from db.settings import LIVE_COUNTS_CHANNEL, LIVE_COUNTS_RECONNECT_DELAY
+
+logger = logging.getLogger(__name__)
+
+# Счётчик None означает, что мероприятие удалено
+DELETED = None
+
+
+class Subscription:
+    """
+    Подписка одного SSE-соединения. Хранит только последний счётчик по каждому мероприятию:
+    если клиент не успевает читать, промежуточные значения схлопываются, а не копятся в очереди.
+    """
+
+    def __init__(self, event_ids: Iterable[int]):
+        self.event_ids = frozenset(event_ids)
+        self._pending: Dict[int, Optional[int]] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, event_id: int, count: Optional[int]):
+        self._pending[event_id] = count
+        self._ready.set()
+
+    async def changes(self, timeout: float) -> Dict[int, Optional[int]]:
+        """Накопившиеся изменения; пустой словарь, если за timeout ничего не пришло."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._ready.clear()
+        pending, self._pending = self._pending, {}
+        return pending
+
+
+class LiveCounts:
+    """
+    Раздаёт изменения счётчиков регистраций открытым SSE-соединениям этого воркера.
+    Ручки записи публикуют новый счётчик сразу после коммита, а в ту же транзакцию кладут
+    pg_notify (db.dals.count_notification) — остальные воркеры получают его через LISTEN
+    на отдельном соединении основной базы. Свои уведомления воркер узнаёт по instance_id и пропускает.
+    """
+
+    def __init__(self, engine, channel: str, reconnect_delay: float):
+        self.engine = engine
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.instance_id = uuid.uuid4().hex
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+        # Растёт на каждое изменение счётчиков, своё или из другого воркера (см. seat_version)
+        self._version = 0
+        self._listening = False
+
+    def seat_version(self) -> Optional[str]:
+        """
+        Метка состояния счётчиков и регистраций: меняется при любом изменении в любом воркере.
+        None, пока LISTEN не работает — тогда изменения других воркеров сюда не доходят.
+        """
+        if not self._listening:
+            return None
+        return f"{self.instance_id}:{self._version}"
+
+    @contextlib.contextmanager
+    def subscribe(self, event_ids: Iterable[int]) -> Iterator[Subscription]:
+        subscription = Subscription(event_ids)
+        for event_id in subscription.event_ids:
+            self._subscriptions[event_id].add(subscription)
+        LIVE_COUNT_STREAMS.inc()
+        try:
+            yield subscription
+        finally:
+            LIVE_COUNT_STREAMS.dec()
+            for event_id in subscription.event_ids:
+                subscribers = self._subscriptions.get(event_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[event_id]
+
+    def publish(self, event_id: int, count: Optional[int], source: str = "local"):
+        self._version += 1
+        subscribers = self._subscriptions.get(event_id)
+        if not subscribers:
+            return
+        LIVE_COUNT_UPDATES.labels(source).inc()
+        for subscription in subscribers:
+            subscription.push(event_id, count)
+
+    async def notify_deleted(self, session, event_id: int):
+        """Уведомление об удалении мероприятия; уходит вместе с коммитом транзакции session."""
+        await session.execute(select(func.pg_notify(self.channel, f"{self.instance_id}:{event_id}:")))
+
+    def _on_notification(self, connection, pid, channel, payload: str):
+        try:
+            sender, event_id, count = payload.split(":")
+            if sender != self.instance_id:
+                self.publish(int(event_id), int(count) if count else DELETED, source="notify")
+        except ValueError:
+            logger.warning("Malformed %s notification: %r", channel, payload)
+
+    async def listen_forever(self):
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver_connection = raw.driver_connection
+                    closed = asyncio.Event()
+                    driver_connection.add_termination_listener(lambda _: closed.set())
+                    await driver_connection.add_listener(self.channel, self._on_notification)
+                    logger.info("Listening for %s notifications", self.channel)
+                    # Пока соединения не было, изменения могли пройти мимо
+                    self._version += 1
+                    self._listening = True
+                    try:
+                        await closed.wait()
+                        logger.warning("Connection for %s notifications closed, reconnecting", self.channel)
+                    finally:
+                        self._listening = False
+                        # Соединение вернётся в пул, слушатель на нём оставлять нельзя
+                        if not driver_connection.is_closed():
+                            await asyncio.shield(driver_connection.remove_listener(self.channel, self._on_notification))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Listening for %s notifications failed", self.channel)
+            # Пока LISTEN не работает, соединения получают только изменения из своего воркера
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.listen_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+live_counts = LiveCounts(engine, channel=LIVE_COUNTS_CHANNEL, reconnect_delay=LIVE_COUNTS_RECONNECT_DELAY)
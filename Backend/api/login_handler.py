@@ -9,12 +9,15 @@ from starlette import status
 from api.actions.auth import authenticate_user
 from db.settings import ACCESS_TOKEN_EXPIRE_MINUTES
 from api.models import Token
+from api.query_budget import query_budget
 from db.session import get_db
 from security import create_access_token
 
 login_router = APIRouter()
 
 @login_router.post("/token", response_model=Token)
+# Пользователь и, если поменялась стоимость bcrypt, обновление хеша
+@query_budget(2)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from email.message import EmailMessage
+from typing import List, Optional
+
+import aiosmtplib
+
+from api.metrics import SMTP_SEND_DURATION, SMTP_MESSAGES, SMTP_ERRORS, SMTP_CONNECTIONS_OPENED
+from db.settings import my_email, password, SMTP_HOST, SMTP_PORT, SMTP_USE_TLS, SMTP_TIMEOUT, SMTP_POOL_SIZE, \
+    SMTP_CONCURRENCY, SMTP_ACQUIRE_TIMEOUT, SMTP_MAX_RETRIES, SMTP_RETRY_BACKOFF, SMTP_FAKE, SMTP_FAKE_CONNECT_LATENCY, \
+    SMTP_FAKE_SEND_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых есть смысл повторить отправку
+RETRYABLE_ERRORS = (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError)
+
+
+@dataclass
+class DeliveryResult:
+    recipient: str
+    ok: bool
+    attempts: int
+    error: Optional[str] = None
+    # Ошибку не исправит повтор (например, сервер отклонил адрес)
+    permanent: bool = False
+
+
+class FakeSMTP:
+    """Имитация SMTP-сервера: задержки на подключение и отправку, письма складываются в outbox."""
+
+    def __init__(self, outbox: list, connect_latency: float, send_latency: float):
+        self.outbox = outbox
+        self.connect_latency = connect_latency
+        self.send_latency = send_latency
+        self.is_connected = False
+
+    async def connect(self):
+        await asyncio.sleep(self.connect_latency)
+        self.is_connected = True
+
+    async def send_message(self, message: EmailMessage):
+        if not self.is_connected:
+            raise aiosmtplib.SMTPServerDisconnected("Fake SMTP connection is closed")
+        await asyncio.sleep(self.send_latency)
+        self.outbox.append(message)
+
+    async def quit(self):
+        self.is_connected = False
+
+
+class SMTPPool:
+    """Небольшой пул авторизованных SMTP-соединений, которые переиспользуются между письмами."""
+
+    def __init__(self, size: int, fake: bool = False, acquire_timeout: Optional[float] = None):
+        self.size = size
+        self.fake = fake
+        self.acquire_timeout = acquire_timeout
+        self.fake_outbox: List[EmailMessage] = []
+        self.connections_opened = 0
+        self._idle: "asyncio.Queue" = asyncio.Queue()
+        # Слоты пула: занятый слот — соединение, выданное наружу. Слот возвращается при любом
+        # исходе (release, discard, ошибка подключения), поэтому ожидающий всегда просыпается
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self):
+        if self.fake:
+            conn = FakeSMTP(self.fake_outbox, SMTP_FAKE_CONNECT_LATENCY, SMTP_FAKE_SEND_LATENCY)
+            await conn.connect()
+        else:
+            conn = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, use_tls=SMTP_USE_TLS, timeout=SMTP_TIMEOUT)
+            await conn.connect()
+            if my_email and password:
+                await conn.login(my_email, password)
+        self.connections_opened += 1
+        SMTP_CONNECTIONS_OPENED.inc()
+        return conn
+
+    async def acquire(self):
+        # asyncio.TimeoutError входит в RETRYABLE_ERRORS: отправка попробует ещё раз после backoff
+        await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        try:
+            while not self._idle.empty():
+                conn = self._idle.get_nowait()
+                if conn.is_connected:
+                    return conn
+                # Сервер закрыл простаивающее соединение, открываем новое на его месте
+            return await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard: bool = False):
+        if discard:
+            asyncio.ensure_future(self._quit(conn))
+        else:
+            self._idle.put_nowait(conn)
+        self._slots.release()
+
+    @staticmethod
+    async def _quit(conn):
+        try:
+            await conn.quit()
+        except Exception:
+            pass
+
+    async def close(self):
+        while not self._idle.empty():
+            await self._quit(self._idle.get_nowait())
+
+
+class Mailer:
+    """Рассылка писем через пул соединений с ограничением параллельности и повторами с backoff."""
+
+    def __init__(self, pool: SMTPPool, sender: Optional[str], concurrency: int, max_retries: int, backoff: float):
+        self.pool = pool
+        self.sender = sender
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def build_message(self, recipient: str, subject: str, body: str) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        return message
+
+    async def send(self, recipient: str, subject: str, body: str) -> DeliveryResult:
+        message = self.build_message(recipient, subject, body)
+        error = None
+        async with self._semaphore:
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    conn = await self.pool.acquire()
+                except RETRYABLE_ERRORS as e:
+                    SMTP_ERRORS.labels(type(e).__name__).inc()
+                    error = repr(e)
+                else:
+                    started = time.perf_counter()
+                    try:
+                        await conn.send_message(message)
+                    except aiosmtplib.SMTPRecipientsRefused as e:
+                        # Адрес отклонён сервером, повтор не поможет
+                        self.pool.release(conn)
+                        SMTP_ERRORS.labels(type(e).__name__).inc()
+                        SMTP_MESSAGES.labels("refused").inc()
+                        return DeliveryResult(recipient, False, attempt, repr(e), permanent=True)
+                    except RETRYABLE_ERRORS as e:
+                        self.pool.release(conn, discard=True)
+                        SMTP_ERRORS.labels(type(e).__name__).inc()
+                        error = repr(e)
+                    except BaseException:
+                        self.pool.release(conn, discard=True)
+                        raise
+                    else:
+                        self.pool.release(conn)
+                        SMTP_SEND_DURATION.observe(time.perf_counter() - started)
+                        SMTP_MESSAGES.labels("sent").inc()
+                        return DeliveryResult(recipient, True, attempt)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+        logger.warning("Failed to send email to %s after %s attempts: %s", recipient, self.max_retries, error)
+        SMTP_MESSAGES.labels("failed").inc()
+        return DeliveryResult(recipient, False, self.max_retries, error)
+
+    async def close(self):
+        await self.pool.close()
+
+
+_mailer: Optional[Mailer] = None
+
+
+def get_mailer() -> Mailer:
+    global _mailer
+    if _mailer is None:
+        _mailer = Mailer(
+            pool=SMTPPool(size=SMTP_POOL_SIZE, fake=SMTP_FAKE, acquire_timeout=SMTP_ACQUIRE_TIMEOUT),
+            sender=my_email,
+            concurrency=SMTP_CONCURRENCY,
+            max_retries=SMTP_MAX_RETRIES,
+            backoff=SMTP_RETRY_BACKOFF,
+        )
+    return _mailer
+
+
+async def close_mailer():
+    global _mailer
+    if _mailer is not None:
+        await _mailer.close()
+        _mailer = None
@@ -1,9 +1,26 @@
+import logging
+import os
+
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from api.handlers import event_router, user_router, admin_router, registration, images_router
 from api.login_handler import login_router
+from api.mailer import close_mailer
+from api.metrics import MetricsMiddleware, metrics_router
+from api.query_budget import QueryBudgetMiddleware
+from api.live_counts import live_counts
+from api.outbox import outbox_dispatcher
+from api.reminders import reminder_sweeper
+from api.read_routing import PinWritesMiddleware
+from api.slow_queries import close_slow_query_log
+from api.image_pipeline import image_process_pool
+from hashing import hashing_executor
 from confirm_registration import confirm_router
+from db.settings import DATABASE, DATABASE_REPLICA, LOG_LEVEL, QUERY_DEBUG
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="ITAM_Project")
 
@@ -17,6 +34,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PinWritesMiddleware)
+if QUERY_DEBUG:
+    app.add_middleware(QueryBudgetMiddleware)
+# Последним, чтобы в замер попадала вся обработка запроса
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(event_router, tags=["Events"])
 
@@ -30,3 +52,26 @@ app.include_router(admin_router, tags=["Admins"])
 app.include_router(registration, tags=["Registration"])
 
 app. include_router(images_router, tags=["Images"])
+
+app.include_router(metrics_router, tags=["Metrics"])
+
+
+@app.on_event("startup")
+async def start_background_services():
+    logger.info("Database pool (pid %s): %s", os.getpid(), DATABASE.describe())
+    if DATABASE_REPLICA:
+        logger.info("Replica pool (pid %s): %s", os.getpid(), DATABASE_REPLICA.describe())
+    outbox_dispatcher.start()
+    reminder_sweeper.start()
+    live_counts.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await live_counts.stop()
+    await reminder_sweeper.stop()
+    await outbox_dispatcher.stop()
+    await close_mailer()
+    await close_slow_query_log()
+    hashing_executor.shutdown(wait=False)
+    image_process_pool.shutdown(wait=False)
@@ -0,0 +1,326 @@
+import bisect
+import contextvars
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from fastapi import APIRouter
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Registry:
+    """
+    Реестр метрик процесса в текстовом формате Prometheus. Каждый воркер uvicorn отдаёт свои значения,
+    поэтому при нескольких воркерах их нужно скрейпить по отдельности (или агрегировать по instance).
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, label_names, label_values, value in metric.samples():
+                lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        # Метрики могут обновляться из потоков пула, поэтому создание дочерних значений под блокировкой
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[tuple]:
+        for key, child in list(self._children.items()):
+            yield self.name, self.labelnames, key, child.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class CallbackGauge(_Metric):
+    """Значения считаются в момент скрейпа: callback возвращает {значения меток: число}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self._callbacks = []
+
+    def add_callback(self, callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        self._callbacks.append(callback)
+
+    def samples(self) -> Iterable[tuple]:
+        for callback in self._callbacks:
+            for key, value in callback().items():
+                yield self.name, self.labelnames, key, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[tuple]:
+        bucket_labels = self.labelnames + ("le",)
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", bucket_labels, key + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, key, child.sum
+            yield f"{self.name}_count", self.labelnames, key, cumulative
+
+
+# HTTP
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_REQUEST_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being processed")
+HTTP_REQUEST_DB_QUERIES = Histogram("http_request_db_queries", "DB queries per HTTP request", ["route"],
+                                    buckets=COUNT_BUCKETS)
+HTTP_REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "DB time per HTTP request", ["route"])
+
+# База данных
+DB_QUERIES = Counter("db_queries_total", "Executed SQL statements", ["engine", "operation"])
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement execution time", ["engine"])
+DB_POOL_CHECKOUT = Histogram("db_pool_checkout_seconds", "Time waiting for a pooled connection", ["engine"])
+DB_POOL_CHECKED_OUT = CallbackGauge("db_pool_checked_out", "Connections currently checked out", ["engine"])
+DB_POOL_SIZE = CallbackGauge("db_pool_size", "Configured pool size", ["engine"])
+DB_POOL_OVERFLOW = CallbackGauge("db_pool_overflow", "Connections opened above pool size", ["engine"])
+
+# Почта
+SMTP_SEND_DURATION = Histogram("smtp_send_duration_seconds", "Time to hand one message to the SMTP server")
+SMTP_MESSAGES = Counter("smtp_messages_total", "Emails by final delivery result", ["result"])
+SMTP_ERRORS = Counter("smtp_errors_total", "SMTP errors per attempt", ["error"])
+SMTP_CONNECTIONS_OPENED = Counter("smtp_connections_opened_total", "SMTP connections opened")
+
+# Фоновые задачи (outbox, напоминания)
+JOB_DURATION = Histogram("background_job_duration_seconds", "Background job run time", ["job"])
+JOB_FAILURES = Counter("background_job_failures_total", "Background job runs that raised", ["job"])
+JOB_LAST_SUCCESS = Gauge("background_job_last_success_timestamp_seconds", "Unix time of the last successful run",
+                         ["job"])
+JOB_LAG = Histogram("background_job_lag_seconds", "Delay between an item becoming due and being picked up",
+                    ["job"], buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+
+# Живые счётчики регистраций (SSE)
+LIVE_COUNT_STREAMS = Gauge("live_count_streams", "Open live registration count streams")
+LIVE_COUNT_UPDATES = Counter("live_count_updates_total", "Registration count changes fanned out to streams",
+                             ["source"])
+
+
+@dataclass
+class RequestStats:
+    # Метод и путь запроса, для логов медленных запросов
+    route: Optional[str] = None
+    queries: int = 0
+    db_time: float = 0.0
+
+
+# Счётчики текущего HTTP-запроса; в фоновых задачах None
+current_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request_stats", default=None
+)
+
+SQL_OPERATIONS = {"select", "insert", "update", "delete", "with"}
+
+
+def instrument_engine(engine, name: str):
+    """Считает запросы и время в БД по движку и по текущему HTTP-запросу, плюс состояние пула."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        DB_QUERIES.labels(name, operation if operation in SQL_OPERATIONS else "other").inc()
+        DB_QUERY_DURATION.labels(name).observe(elapsed)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        started = exception_context.connection.info.get("query_started_at") if exception_context.connection else None
+        if started:
+            started.pop()
+
+    pool = sync_engine.pool
+    DB_POOL_CHECKED_OUT.add_callback(lambda: {(name,): pool.checkedout()})
+    DB_POOL_SIZE.add_callback(lambda: {(name,): pool.size()})
+    DB_POOL_OVERFLOW.add_callback(lambda: {(name,): max(pool.overflow(), 0)})
+
+
+def instrumented_pool(name: str):
+    """Класс пула, который замеряет ожидание свободного соединения (включая открытие нового)."""
+
+    class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                DB_POOL_CHECKOUT.labels(name).observe(time.perf_counter() - started)
+
+    return InstrumentedAsyncQueuePool
+
+
+class MetricsMiddleware:
+    """
+    Латентность и статусы по шаблону маршрута (/events/{event_id}, а не конкретный путь),
+    а также число запросов в БД и время в БД на один HTTP-запрос.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths = None
+
+    def _route_for(self, scope: Scope) -> str:
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path for route in scope["app"].router.routes if hasattr(route, "endpoint")
+            }
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(route=f"{scope['method']} {scope['path']}")
+        token = current_request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            current_request_stats.reset(token)
+            route = self._route_for(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route, status_code).inc()
+            HTTP_REQUEST_DURATION.labels(method, route).observe(elapsed)
+            HTTP_REQUEST_DB_QUERIES.labels(route).observe(stats.queries)
+            HTTP_REQUEST_DB_SECONDS.labels(route).observe(stats.db_time)
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=REGISTRY.expose(), media_type=CONTENT_TYPE)
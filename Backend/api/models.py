@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -52,6 +52,29 @@ class EventCard(TunedModel):
     date: datetime
     place: str
     tags: str
+    # Добавляются к карточке на каждый запрос, см. EventSeatStatus
+    registered_count: Optional[int] = None
+    seats_remaining: Optional[int] = None
+    registered_by_me: Optional[bool] = None
+
+class EventSeatStatus(BaseModel):
+    event_id: int
+    registered_count: int
+    # None — число мест не ограничено
+    seats_remaining: Optional[int] = None
+    # None для анонимного запроса
+    registered_by_me: Optional[bool] = None
+
+class EventCardPage(BaseModel):
+    items: List[EventCard]
+    next_cursor: Optional[str] = None
+
+class TagFacet(BaseModel):
+    name: str
+    count: int
+
+class TagFacets(BaseModel):
+    items: List[TagFacet]
 
 class UpdateEventResponse(BaseModel):
     updated_event_id: int
@@ -65,6 +88,21 @@ class UserInfoInCab(TunedModel):
     course: Optional[int] = None
     university_group: Optional[str] = None
 
+class AuthUser(TunedModel):
+    """Данные пользователя, нужные для авторизации; хранятся в кэше вместо ORM-объекта"""
+    user_id: int
+    name: str
+    email: str
+    role: str
+    is_active: bool
+    telegram_id: Optional[str] = None
+    telephone_number: Optional[str] = None
+    course: Optional[int] = None
+    university_group: Optional[str] = None
+
+    class Config:
+        allow_mutation = False
+
 class UserCreate(BaseModel):
     name: str
     telegram_id: str
@@ -103,6 +141,10 @@ class UserCard(TunedModel):
     course: Optional[int] = None
     university_group: Optional[str] = None
 
+class UserCardPage(BaseModel):
+    items: List[UserCard]
+    next_cursor: Optional[str] = None
+
 class UserUpdateRequest(BaseModel):
     name: Optional[str]
     email: Optional[str]
@@ -126,6 +168,12 @@ class ShowEventInUserCab(TunedModel):
     event_name: str
     date: datetime
 
+class UserCabinet(BaseModel):
+    profile: UserInfoInCab
+    role: str
+    upcoming_events: List[ShowEventInUserCab]
+    completed_events: List[ShowEventInUserCab]
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from api.mailer import DeliveryResult, get_mailer
+from api.metrics import JOB_DURATION, JOB_FAILURES, JOB_LAST_SUCCESS, JOB_LAG
+from db.dals import OutboxDAL
+from db.session import async_session
+from db.settings import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS, \
+    OUTBOX_RETRY_BACKOFF, OUTBOX_SEND_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    Фоновая задача, которая пачками вычитывает таблицу outbox и отправляет письма.
+    Письма попадают в outbox в той же транзакции, что и изменение данных,
+    поэтому ни рестарт, ни ошибка SMTP не приводят к их потере.
+    """
+
+    def __init__(self, session_factory, batch_size: int, poll_interval: float, lease_seconds: int,
+                 max_attempts: int, retry_backoff: int, send_timeout: float):
+        if send_timeout >= lease_seconds:
+            raise ValueError("outbox send timeout must be shorter than the lease, "
+                             "otherwise another worker claims the batch while it is still being sent")
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.send_timeout = send_timeout
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self):
+        """Будит диспетчер сразу после коммита, не дожидаясь следующего опроса."""
+        self._wakeup.set()
+
+    async def _send(self, message) -> DeliveryResult:
+        """Отправка с пределом по времени: зависшая отправка считается неудачной попыткой."""
+        try:
+            return await asyncio.wait_for(
+                get_mailer().send(message.recipient, message.subject, message.body), timeout=self.send_timeout
+            )
+        except asyncio.TimeoutError:
+            return DeliveryResult(message.recipient, False, message.attempts,
+                                  f"timed out after {self.send_timeout:g}s")
+
+    async def run_once(self) -> int:
+        async with self.session_factory() as session:
+            async with session.begin():
+                batch = await OutboxDAL(session).claim_batch(self.batch_size, self.lease_seconds)
+        if not batch:
+            return 0
+        for message in batch:
+            # Задержка от постановки в очередь до первой попытки отправки
+            if message.attempts == 1:
+                JOB_LAG.labels("outbox").observe(float(message.queued_seconds))
+
+        results = await asyncio.gather(*(self._send(message) for message in batch))
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                outbox_dal = OutboxDAL(session)
+                await outbox_dal.mark_sent([message.id for message, result in zip(batch, results) if result.ok])
+                for message, result in zip(batch, results):
+                    if result.ok:
+                        continue
+                    if result.permanent or message.attempts >= self.max_attempts:
+                        logger.error("Outbox message %s to %s failed permanently: %s",
+                                     message.id, message.recipient, result.error)
+                        await outbox_dal.mark_failed(message.id, result.error, retry_in_seconds=None)
+                    else:
+                        retry_in = self.retry_backoff * 2 ** (message.attempts - 1)
+                        await outbox_dal.mark_failed(message.id, result.error, retry_in_seconds=retry_in)
+        return len(batch)
+
+    async def run_forever(self):
+        while True:
+            self._wakeup.clear()
+            started = time.perf_counter()
+            try:
+                processed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                JOB_FAILURES.labels("outbox").inc()
+                processed = 0
+            else:
+                JOB_LAST_SUCCESS.labels("outbox").set(time.time())
+            JOB_DURATION.labels("outbox").observe(time.perf_counter() - started)
+            # Полная пачка — скорее всего, в очереди есть ещё письма
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+outbox_dispatcher = OutboxDispatcher(
+    session_factory=async_session,
+    batch_size=OUTBOX_BATCH_SIZE,
+    poll_interval=OUTBOX_POLL_INTERVAL,
+    lease_seconds=OUTBOX_LEASE_SECONDS,
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    retry_backoff=OUTBOX_RETRY_BACKOFF,
+    send_timeout=OUTBOX_SEND_TIMEOUT,
+)
@@ -0,0 +1,28 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(*values: Any) -> str:
+    """Упаковывает ключ последней строки страницы в непрозрачную строку для клиента."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> List[Any]:
+    """Распаковывает курсор и приводит значения к ожидаемым типам (null остаётся None); при ошибке отвечает 400."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(payload) != len(types):
+            raise ValueError("cursor length mismatch")
+        return [None if value is None else datetime.fromisoformat(value) if type_ is datetime else type_(value)
+                for value, type_ in zip(payload, types)]
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,109 @@
+import contextlib
+import contextvars
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from db.settings import QUERY_REPEAT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryCounter:
+    """Все SQL-выражения, выполненные внутри блока count_queries(), по тексту выражения."""
+
+    statements: Counter = field(default_factory=Counter)
+
+    @property
+    def count(self) -> int:
+        return sum(self.statements.values())
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Одинаковые по форме выражения, выполненные threshold раз и больше — вероятный N+1."""
+        return [(statement, times) for statement, times in self.statements.most_common() if times >= threshold]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# Стек активных счётчиков текущей задачи: вложенные блоки считают каждый своё
+_active_counters: contextvars.ContextVar[tuple] = contextvars.ContextVar("active_query_counters", default=())
+
+
+def install_query_counter(engine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        for counter in _active_counters.get():
+            counter.statements[statement] += 1
+
+
+@contextlib.contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    counter = QueryCounter()
+    token = _active_counters.set(_active_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+
+@contextlib.contextmanager
+def assert_max_queries(budget: int) -> Iterator[QueryCounter]:
+    """
+    Для тестов и отладки:
+        with assert_max_queries(3):
+            await _create_new_registration(user_id, email, event_id, session)
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > budget:
+        listing = "\n".join(f"  {times}x {statement}" for statement, times in counter.statements.most_common())
+        raise QueryBudgetExceeded(f"Expected at most {budget} queries, got {counter.count}:\n{listing}")
+
+
+def query_budget(budget: int):
+    """
+    Объявляет бюджет запросов ручки; ставится под декоратором роутера. В режиме QUERY_DEBUG
+    превышение пишется в лог, а число запросов отдаётся в заголовке X-Query-Count, по которому
+    его могут проверять тесты через TestClient.
+    """
+
+    def decorator(endpoint):
+        endpoint.query_budget = budget
+        return endpoint
+
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """Режим разработки: считает запросы каждого HTTP-запроса, сверяет с бюджетом ручки и ищет N+1."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as counter:
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    message["headers"] = [*message.get("headers", []), (b"x-query-count", str(counter.count).encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        request_line = f"{scope['method']} {scope['path']}"
+        budget = getattr(scope.get("endpoint"), "query_budget", None)
+        if budget is not None and counter.count > budget:
+            logger.warning("%s ran %s queries, budget is %s", request_line, counter.count, budget)
+        for statement, times in counter.repeated():
+            logger.warning("Possible N+1 in %s: %s identical statements: %s",
+                           request_line, times, " ".join(statement.split())[:300])
@@ -0,0 +1,67 @@
+import hashlib
+from typing import Generator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from api.cache import TTLCache
+from db.session import async_session, async_read_session, read_engine, engine
+from db.settings import READ_YOUR_WRITES_SECONDS, READ_YOUR_WRITES_MAX_CLIENTS
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Клиенты, которые недавно что-то записали: их чтения идут в основную базу, пока реплика догоняет
+pinned_clients = TTLCache(maxsize=READ_YOUR_WRITES_MAX_CLIENTS, ttl=READ_YOUR_WRITES_SECONDS)
+
+
+def client_key(headers) -> Optional[str]:
+    """Клиент определяется по токену авторизации; анонимные запросы не закрепляются."""
+    authorization = headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+def is_pinned(request: Request) -> bool:
+    if read_engine is engine:
+        return False
+    key = client_key(request.headers)
+    return key is not None and pinned_clients.get(key) is not None
+
+
+class PinWritesMiddleware:
+    """
+    После успешного пишущего запроса закрепляет клиента за основной базой на READ_YOUR_WRITES_SECONDS.
+    Закрепление ставится до отправки ответа, поэтому следующий запрос клиента его уже увидит.
+    Состояние живёт в процессе, как и остальные кэши.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or read_engine is engine:
+            await self.app(scope, receive, send)
+            return
+        key = client_key(Request(scope).headers)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                pinned_clients.set(key, True)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+async def get_read_db(request: Request) -> Generator:
+    """Dependency for getting async session for read-only handlers"""
+    session_factory = async_session if is_pinned(request) else async_read_session
+    try:
+        session: AsyncSession = session_factory()
+        yield session
+    finally:
+        await session.close()
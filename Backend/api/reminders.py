@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func
+
+from api.metrics import JOB_DURATION, JOB_FAILURES, JOB_LAST_SUCCESS, JOB_LAG
+from api.notifications import build_reminder_email
+from api.outbox import outbox_dispatcher
+from db.dals import EventDAL, RegistrationDAL, OutboxDAL
+from db.session import async_session
+from db.settings import REMINDER_SWEEP_INTERVAL, REMINDER_LEAD_HOURS
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки Postgres: в каждом такте напоминания рассылает только один воркер
+REMINDER_LOCK_KEY = 4_150_001
+
+
+class ReminderSweeper:
+    """
+    Периодически находит мероприятия, до начала которых осталось меньше lead, и кладёт напоминания
+    их участникам в outbox. Состояние хранится в events.reminder_sent_at, поэтому рестарты
+    ничего не теряют, а перенос даты (сброс reminder_sent_at) или удаление учитываются сами.
+    """
+
+    def __init__(self, session_factory, interval: float, lead: timedelta):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.lead = lead
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep_once(self) -> int:
+        now = datetime.now()
+        async with self.session_factory() as session:
+            async with session.begin():
+                # Блокировка снимается вместе с транзакцией; остальные воркеры просто пропускают такт
+                is_leader = (await session.execute(select(func.pg_try_advisory_xact_lock(REMINDER_LOCK_KEY)))).scalar()
+                if not is_leader:
+                    return 0
+                events = await EventDAL(session).claim_due_reminders(now, now + self.lead)
+                if not events:
+                    return 0
+                members = await RegistrationDAL(session).get_member_emails_for_events(
+                    [event.event_id for event in events]
+                )
+                emails_by_event = defaultdict(list)
+                for event_id, email in members:
+                    emails_by_event[event_id].append(email)
+
+                messages = []
+                for event in events:
+                    # Насколько позже момента «до начала осталось lead» напоминание ушло в очередь
+                    JOB_LAG.labels("reminders").observe(max((now - (event.date - self.lead)).total_seconds(), 0))
+                    subject, body = build_reminder_email(event, starts_in=event.date - now)
+                    messages += [{"recipient": email, "subject": subject, "body": body}
+                                 for email in emails_by_event[event.event_id]]
+                await OutboxDAL(session).enqueue_messages(messages)
+        logger.info("Queued reminders for %s events (%s emails)", len(events), len(messages))
+        outbox_dispatcher.wake()
+        return len(events)
+
+    async def run_forever(self):
+        while True:
+            started = time.perf_counter()
+            try:
+                await self.sweep_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder sweep failed")
+                JOB_FAILURES.labels("reminders").inc()
+            else:
+                JOB_LAST_SUCCESS.labels("reminders").set(time.time())
+            JOB_DURATION.labels("reminders").observe(time.perf_counter() - started)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+reminder_sweeper = ReminderSweeper(
+    session_factory=async_session,
+    interval=REMINDER_SWEEP_INTERVAL,
+    lead=timedelta(hours=REMINDER_LEAD_HOURS),
+)
@@ -0,0 +1,155 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from api.cache import TTLCache
+from api.fast_json import dumps
+from db.settings import RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_SIZE
+
+
+def _etag(body: bytes) -> str:
+    # Сильный ETag от содержимого совпадает во всех воркерах, где ответ одинаковый
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    version: tuple
+    created_at: float
+    # Исходное содержимое до кодирования, для serve_overlaid
+    content: Any = None
+
+
+class VersionedResponseCache:
+    """
+    Кэш готовых JSON-ответов для чтения мероприятий. Каждая запись помнит версию данных,
+    под которой она построена: запись мероприятий увеличивает версию, и старые ответы
+    перестают совпадать. Версии живут в процессе, поэтому другие воркеры увидят изменение
+    не позже, чем через TTL — это и есть окно устаревания.
+
+    Версия мероприятия — значение общего счётчика list_version на момент его последнего изменения.
+    event_versions помнит не больше maxsize мероприятий: вытесненное получает версию _version_floor,
+    которая не меньше его последней версии, так что старые записи кэша снова совпасть не могут.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.list_version = 0
+        self.event_versions: "OrderedDict[int, int]" = OrderedDict()
+        self._version_floor = 0
+        self.not_modified = 0
+        self.stale_drops = 0
+        self.max_served_age = 0.0
+
+    def version_for(self, event_id: Optional[int] = None) -> tuple:
+        if event_id is None:
+            return ("list", self.list_version)
+        return ("event", event_id, self.event_versions.get(event_id, self._version_floor))
+
+    def invalidate(self, event_id: Optional[int] = None):
+        """Вызывается после коммита любого изменения мероприятий."""
+        self.list_version += 1
+        if event_id is not None:
+            self.event_versions[event_id] = self.list_version
+            self.event_versions.move_to_end(event_id)
+            while len(self.event_versions) > self._cache.maxsize:
+                _, evicted = self.event_versions.popitem(last=False)
+                self._version_floor = max(self._version_floor, evicted)
+
+    def _get(self, key: Hashable, version: tuple) -> Optional[CachedResponse]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry.version != version:
+            self._cache.pop(key)
+            self.stale_drops += 1
+            # Запись была найдена, но устарела: засчитываем как промах
+            self._cache.hits -= 1
+            self._cache.misses += 1
+            return None
+        self.max_served_age = max(self.max_served_age, time.monotonic() - entry.created_at)
+        return entry
+
+    def _not_modified(self, request: Request, etag: str, headers: dict) -> Optional[Response]:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return None
+
+    def _respond(self, request: Request, body: bytes, etag: str, headers: Optional[dict] = None) -> Response:
+        headers = {"etag": etag, "cache-control": "no-cache", **(headers or {})}
+        return self._not_modified(request, etag, headers) or \
+            Response(content=body, media_type="application/json", headers=headers)
+
+    async def _entry(self, key: Hashable, build: Callable[[], Awaitable[Any]], event_id: Optional[int],
+                     fresh: bool) -> CachedResponse:
+        # Версию берём до запроса в БД: если запись случится во время запроса, ответ сразу станет устаревшим
+        version = self.version_for(event_id)
+        entry = None if fresh else self._get(key, version)
+        if entry is None:
+            content = await build()
+            body = dumps(content)
+            entry = CachedResponse(body=body, etag=_etag(body), version=version, created_at=time.monotonic(),
+                                   content=content)
+            self._cache.set(key, entry)
+        return entry
+
+    async def serve(self, request: Request, key: Hashable, build: Callable[[], Awaitable[Any]],
+                    event_id: Optional[int] = None, fresh: bool = False) -> Response:
+        """
+        build возвращает pydantic-модель или уже готовые dict/строки БД в форме ответа — они кодируются
+        orjson без проверки схемы. fresh=True строит ответ заново и перезаписывает кэш: так автор записи
+        не получит ответ, собранный с отстающей реплики.
+        """
+        entry = await self._entry(key, build, event_id, fresh)
+        return self._respond(request, entry.body, entry.etag)
+
+    async def serve_overlaid(self, request: Request, key: Hashable, build: Callable[[], Awaitable[Any]],
+                             overlay: Callable[[Any], Awaitable[Any]], event_id: Optional[int] = None,
+                             fresh: bool = False, stamp: Optional[str] = None) -> Response:
+        """
+        Как serve, но к закэшированному содержимому на каждый запрос добавляются быстро меняющиеся
+        или личные данные: overlay получает содержимое из кэша и возвращает новое, не изменяя старое.
+
+        stamp — дешёвая метка того, от чего зависит overlay (пользователь и версия счётчиков); её нужно
+        получить до запроса overlay. С меткой ETag считается от записи кэша, метки и окна TTL, и
+        If-None-Match проверяется до overlay: совпадение отвечает 304 без запроса в БД и без кодирования.
+        Окно TTL ограничивает устаревание, если overlay читал отстающую реплику; оно считается по
+        time.time(), а не monotonic(), у которого в каждом процессе своя точка отсчёта. Метка счётчиков
+        своя у каждого воркера, поэтому такой ETag совпадает только в пределах воркера.
+        Без метки ETag считается по итоговому телу и одинаков во всех воркерах.
+        """
+        entry = await self._entry(key, build, event_id, fresh)
+        headers = {"vary": "Authorization"}
+        if stamp is None:
+            body = dumps(await overlay(entry.content))
+            return self._respond(request, body, _etag(body), headers=headers)
+        window = int(time.time() // self._cache.ttl)
+        etag = _etag(f"{entry.etag}:{stamp}:{window}".encode())
+        headers = {"etag": etag, "cache-control": "no-cache", **headers}
+        return self._not_modified(request, etag, headers) or \
+            Response(content=dumps(await overlay(entry.content)), media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            **self._cache.stats(),
+            "not_modified": self.not_modified,
+            "stale_drops": self.stale_drops,
+            "staleness_window_seconds": self._cache.ttl,
+            "max_served_age_seconds": self.max_served_age,
+        }
+
+
+event_response_cache = VersionedResponseCache(maxsize=RESPONSE_CACHE_MAX_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS)
+
+
+def request_cache_key(name: str, request: Request) -> tuple:
+    return (name, tuple(sorted(request.query_params.multi_items())))
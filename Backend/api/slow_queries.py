@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import event
+
+from api.metrics import current_request_stats
+from db.settings import SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_EXPLAIN_SAMPLE_RATE, SLOW_QUERY_LOG_FILE, \
+    SLOW_QUERY_LOG_MAX_BYTES, SLOW_QUERY_LOG_BACKUPS, SLOW_QUERY_MAX_EXPLAINS
+
+logger = logging.getLogger("slow_queries")
+logger.propagate = False
+
+EXPLAINABLE = ("select", "with")
+# EXPLAIN ANALYZE выполняет выражение заново на отдельном соединении, поэтому с ANALYZE идёт только
+# чистое чтение: SELECT ... FROM без блокировок строк. WITH может содержать пишущий CTE, SELECT ... FOR UPDATE
+# (delete_event) встанет в очередь за блокировкой запроса, а SELECT без FROM — это вызов функции
+# с побочным эффектом (pg_notify, pg_try_advisory_xact_lock). Такие запросы получают обычный EXPLAIN
+ANALYZABLE = ("select",)
+_FROM = re.compile(r"\bfrom\b", re.IGNORECASE)
+_ROW_LOCK = re.compile(r"\bfor\s+(no\s+key\s+update|key\s+share|update|share)\b", re.IGNORECASE)
+_SIDE_EFFECTS = re.compile(r"\b(pg_notify|pg_(try_)?advisory_\w*lock\w*|nextval|setval)\s*\(", re.IGNORECASE)
+
+
+def can_analyze(statement: str) -> bool:
+    """Можно ли повторно выполнить запрос через EXPLAIN ANALYZE, ничего не заблокировав и не изменив."""
+    return (statement.lstrip()[:6].lower().startswith(ANALYZABLE)
+            and _FROM.search(statement) is not None
+            and _ROW_LOCK.search(statement) is None
+            and _SIDE_EFFECTS.search(statement) is None)
+MAX_PARAMETER_LENGTH = 200
+
+# Внутри фоновой задачи EXPLAIN сам EXPLAIN не записываем
+_explaining: contextvars.ContextVar[bool] = contextvars.ContextVar("slow_query_explaining", default=False)
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    # Стандартный QueueHandler превращает msg в строку; запись остаётся словарём до JSONFormatter
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SlowQueryLog:
+    """
+    Пишет выражения дольше порога в ротируемый файл, по строке JSON на запись: SQL, параметры,
+    HTTP-запрос, в котором он выполнялся, и длительность. Для доли читающих запросов в фоне
+    снимается план на отдельном соединении: для SELECT — EXPLAIN (ANALYZE, BUFFERS), для WITH —
+    EXPLAIN без выполнения. Сам запрос при этом не ждёт.
+    Запись в файл идёт через очередь в отдельном потоке, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, path: str, threshold_ms: float, explain_sample_rate: float, max_explains: int,
+                 max_bytes: int, backups: int):
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.max_explains = max_explains
+        self._explains = set()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8")
+        file_handler.setFormatter(JSONFormatter())
+        records = queue.SimpleQueue()
+        logger.addHandler(_RecordQueueHandler(records))
+        logger.setLevel(logging.INFO)
+        self._listener = logging.handlers.QueueListener(records, file_handler)
+        self._listener.start()
+
+    def attach(self, engine, name: str):
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_started_at", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["slow_query_started_at"].pop()
+            if elapsed >= self.threshold and not _explaining.get():
+                self.record(engine, name, statement, parameters, elapsed, executemany)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(exception_context):
+            connection = exception_context.connection
+            started = connection.info.get("slow_query_started_at") if connection is not None else None
+            if started:
+                started.pop()
+
+    def record(self, engine, engine_name: str, statement: str, parameters, elapsed: float, executemany: bool):
+        stats = current_request_stats.get()
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "engine": engine_name,
+            "route": stats.route if stats is not None else "background",
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": " ".join(statement.split()),
+            "parameters": self._format_parameters(parameters, executemany),
+        }
+        if self._should_explain(statement, executemany):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                task = loop.create_task(self._explain(engine, statement, parameters, entry))
+                self._explains.add(task)
+                task.add_done_callback(self._explains.discard)
+                return
+        logger.info(entry)
+
+    def _should_explain(self, statement: str, executemany: bool) -> bool:
+        # Пишущие запросы не трогаем вовсе, остальные без ANALYZE, если не проходят can_analyze
+        return (not executemany
+                and statement.lstrip()[:6].lower().startswith(EXPLAINABLE)
+                and len(self._explains) < self.max_explains
+                and random.random() < self.explain_sample_rate)
+
+    @staticmethod
+    def _format_parameters(parameters, executemany: bool):
+        if executemany:
+            return f"<{len(parameters)} parameter sets>"
+        if isinstance(parameters, dict):
+            return {key: repr(value)[:MAX_PARAMETER_LENGTH] for key, value in parameters.items()}
+        return [repr(value)[:MAX_PARAMETER_LENGTH] for value in parameters or ()]
+
+    async def _explain(self, engine, statement: str, parameters, entry: dict):
+        _explaining.set(True)
+        try:
+            options = "ANALYZE, BUFFERS, FORMAT JSON" if can_analyze(statement) else "FORMAT JSON"
+            async with engine.connect() as conn:
+                result = await conn.exec_driver_sql(f"EXPLAIN ({options}) " + statement, parameters)
+                plan = result.scalar()
+                entry["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+                await conn.rollback()
+        except Exception as e:
+            entry["explain_error"] = repr(e)
+        logger.info(entry)
+
+    async def close(self):
+        for task in list(self._explains):
+            task.cancel()
+        self._listener.stop()
+
+
+slow_query_log: Optional[SlowQueryLog] = None
+
+
+def install_slow_query_log(*engines) -> SlowQueryLog:
+    """engines — пары (движок, имя). Вызывается из db/session.py, если включён SLOW_QUERY_LOG."""
+    global slow_query_log
+    if slow_query_log is None:
+        slow_query_log = SlowQueryLog(
+            path=SLOW_QUERY_LOG_FILE,
+            threshold_ms=SLOW_QUERY_THRESHOLD_MS,
+            explain_sample_rate=SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+            max_explains=SLOW_QUERY_MAX_EXPLAINS,
+            max_bytes=SLOW_QUERY_LOG_MAX_BYTES,
+            backups=SLOW_QUERY_LOG_BACKUPS,
+        )
+    for engine, name in engines:
+        slow_query_log.attach(engine, name)
+    return slow_query_log
+
+
+async def close_slow_query_log():
+    if slow_query_log is not None:
+        await slow_query_log.close()
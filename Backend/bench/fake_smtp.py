@@ -0,0 +1,90 @@
+"""
+Локальный SMTP-сервер-заглушка для нагрузочных тестов: принимает письма по сети и выбрасывает их,
+считая принятые. В отличие от SMTP_FAKE, приложение ходит в него через настоящий aiosmtplib.
+
+Запуск из папки Backend (приложению: SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_USE_TLS=false):
+    python -m bench.fake_smtp --port 2525 [--latency 0.02]
+"""
+import argparse
+import asyncio
+
+
+class FakeSMTPServer:
+    """Минимальный SMTP: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT. Без TLS и авторизации."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.messages_received = 0
+        self.connections = 0
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        async def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        try:
+            await reply("220 localhost fake SMTP ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith("EHLO"):
+                    await reply("250-localhost\r\n250-8BITMIME\r\n250 SMTPUTF8")
+                elif command.startswith("HELO"):
+                    await reply("250 localhost")
+                elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    self.messages_received += 1
+                    await reply("250 OK queued")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка на приём письма, с")
+    args = parser.parse_args()
+    server = FakeSMTPServer(args.host, args.port, args.latency)
+    await server.start()
+    print(f"fake SMTP listening on {args.host}:{server.port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"received {server.messages_received} messages over {server.connections} connections")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Задержка event loop во время пачки одновременных логинов.
+
+Параллельно с N проверками пароля крутится «пульс», который каждые 10 мс засыпает
+и замеряет, насколько позже запланированного он проснулся. Сравниваются синхронный
+Hasher (как было раньше) и AsyncHasher с пулом потоков.
+
+Запуск из папки Backend:
+    python -m bench.hashing_event_loop --logins 20 --rounds 12
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+import hashing
+from hashing import Hasher, AsyncHasher
+
+TICK = 0.01
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def sync_login(plain: str, hashed: str):
+    return Hasher.verify_password(plain, hashed)
+
+
+async def async_login(plain: str, hashed: str):
+    return await AsyncHasher.verify_and_update(plain, hashed)
+
+
+async def measure(login, logins: int, plain: str, hashed: str):
+    lags = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(TICK * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(login(plain, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    return elapsed, statistics.median(lags_ms), p99, lags_ms[-1]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    # Бенчмарк задаёт стоимость сам, не трогая настройки приложения
+    hashing.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=args.rounds)
+    plain = "correct horse battery staple"
+    hashed = hashing.pwd_context.hash(plain)
+
+    print(f"{args.logins} concurrent logins, bcrypt rounds={args.rounds}, "
+          f"pool workers={hashing.hashing_executor._max_workers}")
+    for name, login in (("sync (event loop)", sync_login), ("async (thread pool)", async_login)):
+        elapsed, p50, p99, worst = await measure(login, args.logins, plain, hashed)
+        print(f"{name:20} total {elapsed:6.2f}s | loop lag p50 {p50:7.1f} ms, p99 {p99:7.1f} ms, max {worst:7.1f} ms")
+    hashing.hashing_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,345 @@
+"""
+Нагрузочный тест основных сценариев API на локальном Postgres.
+
+Скрипт заполняет базу (DATABASE_URL) тестовыми пользователями, мероприятиями, регистрациями и картинками,
+поднимает приложение через uvicorn с почтой на локальном fake-SMTP (bench.fake_smtp) и гоняет
+виртуальных пользователей: логин, список мероприятий, карточка, запись, отмена записи, картинка.
+Результат — p50/p95/p99 и пропускная способность по каждому маршруту, плюс JSON-файл,
+который можно сравнить с прогоном другой версии через --baseline.
+
+Запуск из папки Backend:
+    python -m bench.load_test --users 2000 --events 500 --concurrency 50 --duration 60
+    python -m bench.load_test --base-url http://127.0.0.1:8000 --skip-seed   # уже запущенный сервер
+    python -m bench.load_test --baseline bench/results/old.json ...           # сравнение с прошлым прогоном
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import httpx
+from PIL import Image as PillowImage
+from sqlalchemy import text, insert
+
+from api.image_pipeline import process_image, save_variant_files, image_process_pool
+from api.image_store import image_store
+from bench.fake_smtp import FakeSMTPServer
+from db.models import Image, ImageVariant
+from db.session import engine
+from hashing import pwd_context
+
+LOAD_EMAIL = "load-{}@example.invalid"
+LOAD_PASSWORD = "load-test-password"
+LOAD_EVENT_PREFIX = "Load event "
+
+
+async def reset(conn):
+    load_events = f"SELECT event_id FROM events WHERE event_name LIKE '{LOAD_EVENT_PREFIX}%'"
+    load_users = "SELECT user_id FROM users WHERE email LIKE 'load-%@example.invalid'"
+    await conn.execute(text("DELETE FROM outbox WHERE recipient LIKE 'load-%@example.invalid'"))
+    await conn.execute(text(
+        f"DELETE FROM registrations WHERE user_id IN ({load_users}) OR event_id IN ({load_events})"
+    ))
+    await conn.execute(text(
+        f"DELETE FROM image_variants WHERE image_id IN (SELECT id FROM images WHERE event_id IN ({load_events}))"
+    ))
+    await conn.execute(text(f"DELETE FROM images WHERE event_id IN ({load_events})"))
+    await conn.execute(text(f"DELETE FROM events WHERE event_name LIKE '{LOAD_EVENT_PREFIX}%'"))
+    await conn.execute(text("DELETE FROM users WHERE email LIKE 'load-%@example.invalid'"))
+
+
+def sample_image() -> bytes:
+    img = PillowImage.effect_mandelbrot((1600, 1600), (-2.0, -1.5, 1.0, 1.5), 100).convert("RGB")
+    buffer = BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def seed(users: int, events: int, registrations_per_user: int):
+    """Данные создаются запросами generate_series; у всех пользователей один пароль и один хеш."""
+    hashed_password = pwd_context.hash(LOAD_PASSWORD)
+    data = sample_image()
+    processed = await process_image(data)
+    original_digest = image_store.save(data)
+    variants = save_variant_files(processed)
+
+    async with engine.begin() as conn:
+        await reset(conn)
+        await conn.execute(text("""
+            INSERT INTO events (event_name, place, short_description, long_description, max_count_of_members,
+                                format, online_event_link, date, tags, is_active, registered_count)
+            SELECT :prefix || g, 'Online', 'Load test event', 'Load test event description', NULL,
+                   'Online', NULL, now() + g * interval '1 hour', 'load,test', true, 0
+            FROM generate_series(1, :events) g
+        """), {"prefix": LOAD_EVENT_PREFIX, "events": events})
+        await conn.execute(text("""
+            INSERT INTO users (name, email, hashed_password, role, is_active)
+            SELECT 'Load user ' || g, 'load-' || g || '@example.invalid', :hashed_password, 'user', true
+            FROM generate_series(1, :users) g
+        """), {"hashed_password": hashed_password, "users": users})
+        await conn.execute(text(f"""
+            WITH e AS (SELECT array_agg(event_id) AS ids FROM events WHERE event_name LIKE '{LOAD_EVENT_PREFIX}%'),
+                 u AS (SELECT user_id, row_number() OVER () AS n FROM users WHERE email LIKE 'load-%@example.invalid')
+            INSERT INTO registrations (user_id, event_id, event_is_active)
+            SELECT u.user_id, e.ids[1 + ((u.n * 7919 + k * 104729) % array_length(e.ids, 1))::int], true
+            FROM u, e, generate_series(1, :per_user) k
+            ON CONFLICT DO NOTHING
+        """), {"per_user": registrations_per_user})
+        await conn.execute(text(f"""
+            UPDATE events e SET registered_count = counts.total
+            FROM (SELECT event_id, count(*) AS total FROM registrations GROUP BY event_id) counts
+            WHERE counts.event_id = e.event_id AND e.event_name LIKE '{LOAD_EVENT_PREFIX}%'
+        """))
+        event_ids = (await conn.execute(text(
+            f"SELECT event_id FROM events WHERE event_name LIKE '{LOAD_EVENT_PREFIX}%' ORDER BY event_id"
+        ))).scalars().all()
+        # Одна и та же картинка у всех мероприятий: файл в хранилище один, строки в БД — свои
+        image_ids = (await conn.execute(
+            insert(Image).values([
+                {"event_id": event_id, "sha256": original_digest, "content_type": processed.content_type,
+                 "size": len(data)} for event_id in event_ids
+            ]).returning(Image.id)
+        )).scalars().all()
+        await conn.execute(insert(ImageVariant), [
+            {"image_id": image_id, **variant} for image_id in image_ids for variant in variants
+        ])
+        await conn.execute(text("ANALYZE events, users, registrations, images, image_variants"))
+    await engine.dispose()
+    print(f"seeded {users} users, {len(event_ids)} events, ~{users * registrations_per_user} registrations")
+    return event_ids
+
+
+async def load_event_ids():
+    async with engine.connect() as conn:
+        event_ids = (await conn.execute(text(
+            f"SELECT event_id FROM events WHERE event_name LIKE '{LOAD_EVENT_PREFIX}%' ORDER BY event_id"
+        ))).scalars().all()
+    await engine.dispose()
+    return event_ids
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, always: bool = False,
+                      **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        elapsed = time.perf_counter() - start
+        if self.recording or always:
+            self.latencies[route].append(elapsed)
+            self.statuses[route][str(status)] += 1
+        return response
+
+
+async def virtual_user(number: int, args, client: httpx.AsyncClient, recorder: Recorder, event_ids, deadline: float):
+    rnd = random.Random(number)
+    email = LOAD_EMAIL.format(1 + number % args.users)
+    # Логин выполняется один раз на старте, поэтому записывается и во время прогрева
+    response = await recorder.request(client, "POST /login/token", "POST", "/login/token", always=True,
+                                      data={"username": email, "password": LOAD_PASSWORD})
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    while time.perf_counter() < deadline:
+        event_id = rnd.choice(event_ids)
+        await recorder.request(client, "GET /events", "GET", "/events", params={"limit": 20})
+        await recorder.request(client, "GET /events/{id}", "GET", f"/events/{event_id}")
+        await recorder.request(client, "GET /show_event_image/{id}", "GET", f"/show_event_image/{event_id}",
+                               params={"size": "card"}, headers={"Accept": "image/webp"})
+        await recorder.request(client, "POST /add_member", "POST", "/add_member",
+                               params={"event_id": event_id}, headers=headers)
+        await recorder.request(client, "DELETE /cancel_registration", "DELETE", "/cancel_registration",
+                               params={"event_id": event_id}, headers=headers)
+        if args.think_time:
+            await asyncio.sleep(rnd.uniform(0, 2 * args.think_time))
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    routes = {}
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        statuses = dict(recorder.statuses[route])
+        ok = sum(count for status, count in statuses.items() if status.isdigit() and int(status) < 400)
+        routes[route] = {
+            "requests": len(values),
+            "ok": ok,
+            "statuses": statuses,
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "latency_ms": {
+                "p50": round(percentile(values, 0.50) * 1000, 2),
+                "p95": round(percentile(values, 0.95) * 1000, 2),
+                "p99": round(percentile(values, 0.99) * 1000, 2),
+                "mean": round(sum(values) / len(values) * 1000, 2),
+                "max": round(values[-1] * 1000, 2),
+            },
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {"routes": routes, "total_requests": total, "total_throughput_rps": round(total / elapsed, 2)}
+
+
+def print_summary(summary: dict, baseline: dict = None):
+    print(f"\n{'route':34} {'req':>7} {'ok':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, stats in summary["routes"].items():
+        latency = stats["latency_ms"]
+        print(f"{route:34} {stats['requests']:>7} {stats['ok']:>7} {stats['throughput_rps']:>8} "
+              f"{latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9}")
+        previous = (baseline or {}).get("routes", {}).get(route)
+        if previous:
+            deltas = [f"{key} {latency[key] - previous['latency_ms'][key]:+.2f}ms" for key in ("p50", "p95", "p99")]
+            rps = stats["throughput_rps"] - previous["throughput_rps"]
+            print(f"{'  vs baseline':34} {'':>7} {'':>7} {rps:>+8.2f} {'  '.join(deltas)}")
+    print(f"\ntotal: {summary['total_requests']} requests, {summary['total_throughput_rps']} rps")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get("/events", params={"limit": 1})).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {base_url} did not start in {timeout}s")
+
+
+def start_server(args, smtp_port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_USE_TLS": "false",
+        "SMTP_FAKE": "false",
+        # Пустые учётные данные: fake-SMTP не требует логина, а .env их не перезапишет
+        "my_gmail": "",
+        "password_gmail": "",
+    }
+    command = [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    return subprocess.Popen(command, env=env)
+
+
+async def run(args):
+    if args.skip_seed:
+        event_ids = await load_event_ids()
+    else:
+        event_ids = await seed(args.users, args.events, args.registrations_per_user)
+    if not event_ids:
+        raise SystemExit("no load test events in the database, run without --skip-seed")
+
+    smtp = None
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        smtp = FakeSMTPServer(latency=args.smtp_latency)
+        smtp_port = await smtp.start()
+        server = start_server(args, smtp_port)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_until_ready(base_url)
+        recorder = Recorder()
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            start = time.perf_counter()
+            measure_from = start + args.warmup
+            deadline = measure_from + args.duration
+
+            async def start_recording():
+                await asyncio.sleep(args.warmup)
+                recorder.recording = True
+
+            await asyncio.gather(start_recording(), *[
+                virtual_user(number, args, client, recorder, event_ids, deadline)
+                for number in range(args.concurrency)
+            ])
+            elapsed = time.perf_counter() - measure_from
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if smtp is not None:
+            await smtp.stop()
+
+    summary = summarize(recorder, elapsed)
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "base_url": base_url,
+            "users": args.users,
+            "events": len(event_ids),
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "duration_seconds": round(elapsed, 2),
+            "warmup_seconds": args.warmup,
+            "emails_received": smtp.messages_received if smtp else None,
+        },
+        **summary,
+    }
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_summary(summary, baseline)
+
+    output = Path(args.output or f"bench/results/load-{result['meta']['commit']}-{int(time.time())}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"results written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--registrations-per-user", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=50, help="число виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=5.0, help="прогрев без записи результатов, с")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза между итерациями, с")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=1, help="воркеры uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--smtp-latency", type=float, default=0.02)
+    parser.add_argument("--base-url", help="нагружать уже запущенный сервер вместо своего uvicorn")
+    parser.add_argument("--skip-seed", action="store_true", help="использовать данные прошлого прогона")
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    finally:
+        image_process_pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
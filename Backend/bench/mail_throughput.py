@@ -0,0 +1,58 @@
+"""
+Замер пропускной способности почтового движка на локальном fake-SMTP.
+
+Запуск из папки Backend:
+    SMTP_FAKE=true python -m bench.mail_throughput --recipients 300 --pool-size 3 --concurrency 10
+
+Для сравнения печатается и старый вариант: новое соединение на каждое письмо, отправка по одному.
+"""
+import argparse
+import asyncio
+import time
+
+from api.mailer import Mailer, SMTPPool, FakeSMTP
+from db.settings import SMTP_FAKE_CONNECT_LATENCY, SMTP_FAKE_SEND_LATENCY
+
+
+async def run_sequential(recipients):
+    outbox = []
+    for recipient in recipients:
+        conn = FakeSMTP(outbox, SMTP_FAKE_CONNECT_LATENCY, SMTP_FAKE_SEND_LATENCY)
+        await conn.connect()
+        await conn.send_message(recipient)
+        await conn.quit()
+    return len(outbox)
+
+
+async def run_pooled(recipients, pool_size, concurrency):
+    pool = SMTPPool(size=pool_size, fake=True)
+    mailer = Mailer(pool, sender="bench@example.com", concurrency=concurrency, max_retries=3, backoff=0.1)
+    results = await asyncio.gather(*(mailer.send(recipient, "Benchmark", "Benchmark body") for recipient in recipients))
+    await mailer.close()
+    return sum(result.ok for result in results), pool.connections_opened
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=300)
+    parser.add_argument("--pool-size", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    recipients = [f"user{i}@example.com" for i in range(args.recipients)]
+
+    if not args.skip_sequential:
+        start = time.perf_counter()
+        sent = await run_sequential(recipients)
+        elapsed = time.perf_counter() - start
+        print(f"sequential: {sent} messages in {elapsed:.2f}s ({sent / elapsed:.1f} msg/s), {sent} connections")
+
+    start = time.perf_counter()
+    sent, connections = await run_pooled(recipients, args.pool_size, args.concurrency)
+    elapsed = time.perf_counter() - start
+    print(f"pooled:     {sent} messages in {elapsed:.2f}s ({sent / elapsed:.1f} msg/s), {connections} connections")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,316 @@
+"""
+Бенчмарк секционирования events/registrations по статусу мероприятия на многолетних данных.
+
+Скрипт создаёт в базе (DATABASE_URL) две временные схемы с одинаковыми данными:
+  plain       — обычные таблицы с частичными индексами по is_active, как до ревизии 0009;
+  partitioned — те же таблицы, секционированные по is_active / event_is_active, как после неё.
+Данные: несколько лет архивных мероприятий, небольшое число предстоящих, у каждого пользователя
+одна активная регистрация и несколько архивных. Запросы — методы DAL, которые вызывают ручки;
+в нужную схему они направляются через schema_translate_map, так что SQL тот же, что в приложении.
+Для каждого запроса печатается p50/p95 в обеих схемах и секции, которые остались в плане
+после отсечения (EXPLAIN). Пишущие запросы (архивация) откатываются.
+
+Запуск из папки Backend:
+    python -m bench.partitioning [--years 5] [--events-per-day 30] [--users 50000]
+    python -m bench.partitioning --baseline bench/results/partitioning-old.json   # сравнение с прошлым прогоном
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.pagination import DEFAULT_PAGE_SIZE
+from bench.load_test import git_commit
+from db.dals import EventDAL, RegistrationDAL, TagDAL
+from db.models import EVENT_SEARCH_VECTOR
+from db.session import engine
+
+LAYOUTS = ("plain", "partitioned")
+SCHEMA = "bench_{}"
+
+EVENT_COLUMNS = ("event_id, event_name, place, short_description, long_description, max_count_of_members, "
+                 "format, online_event_link, date, tags, is_active, registered_count, reminder_sent_at")
+
+
+def create_tables_sql(schema: str, partitioned: bool) -> list:
+    def partition_by(column):
+        return f" PARTITION BY LIST ({column})" if partitioned else ""
+
+    statements = [
+        f"CREATE SCHEMA {schema}",
+        f"""CREATE TABLE {schema}.events (
+            event_id INTEGER NOT NULL, event_name VARCHAR NOT NULL, place VARCHAR NOT NULL,
+            short_description VARCHAR, long_description VARCHAR, max_count_of_members INTEGER,
+            format VARCHAR, online_event_link VARCHAR, date TIMESTAMP, tags VARCHAR,
+            is_active BOOLEAN NOT NULL, registered_count INTEGER NOT NULL DEFAULT 0, reminder_sent_at TIMESTAMP,
+            search_vector TSVECTOR GENERATED ALWAYS AS ({EVENT_SEARCH_VECTOR}) STORED,
+            PRIMARY KEY (event_id, is_active)
+        ){partition_by('is_active')}""",
+        f"""CREATE TABLE {schema}.registrations (
+            id INTEGER NOT NULL, user_id INTEGER, event_id INTEGER NOT NULL, event_is_active BOOLEAN NOT NULL,
+            time_of_registration TIMESTAMP,
+            PRIMARY KEY (id, event_is_active),
+            CONSTRAINT uq_registrations_user_event UNIQUE (user_id, event_id, event_is_active),
+            FOREIGN KEY (event_id, event_is_active) REFERENCES {schema}.events (event_id, is_active)
+                ON UPDATE CASCADE
+        ){partition_by('event_is_active')}""",
+        f"CREATE TABLE {schema}.tags (tag_id INTEGER PRIMARY KEY, name VARCHAR NOT NULL UNIQUE)",
+        f"""CREATE TABLE {schema}.event_tags (
+            event_id INTEGER NOT NULL, tag_id INTEGER NOT NULL REFERENCES {schema}.tags ON DELETE CASCADE,
+            event_is_active BOOLEAN NOT NULL,
+            PRIMARY KEY (event_id, tag_id),
+            FOREIGN KEY (event_id, event_is_active) REFERENCES {schema}.events (event_id, is_active)
+                ON UPDATE CASCADE ON DELETE CASCADE
+        )""",
+    ]
+    if partitioned:
+        for table in ("events", "registrations"):
+            statements += [
+                f"CREATE TABLE {schema}.{table}_active PARTITION OF {schema}.{table} FOR VALUES IN (true)",
+                f"CREATE TABLE {schema}.{table}_archived PARTITION OF {schema}.{table} FOR VALUES IN (false)",
+            ]
+    return statements
+
+
+def create_indexes_sql(schema: str, partitioned: bool) -> list:
+    sort_key = "coalesce(date, 'infinity'::timestamp), event_id"
+    if partitioned:
+        date_indexes = [f"CREATE INDEX ix_events_sort_date ON {schema}.events ({sort_key})"]
+    else:
+        date_indexes = [
+            f"CREATE INDEX ix_events_active_date ON {schema}.events ({sort_key}) WHERE is_active",
+            f"CREATE INDEX ix_events_archived_date ON {schema}.events ({sort_key}) WHERE NOT is_active",
+        ]
+    return date_indexes + [
+        f"CREATE INDEX ix_events_reminder_due ON {schema}.events (date) WHERE is_active AND reminder_sent_at IS NULL",
+        f"CREATE INDEX ix_events_search_vector ON {schema}.events USING gin (search_vector)",
+        f"CREATE INDEX ix_registrations_event_id ON {schema}.registrations (event_id)",
+        f"CREATE INDEX ix_event_tags_tag_id ON {schema}.event_tags (tag_id, event_id)",
+        f"ANALYZE {schema}.events, {schema}.registrations, {schema}.tags, {schema}.event_tags",
+    ]
+
+
+async def drop_schemas(conn):
+    for layout in LAYOUTS:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA.format(layout)} CASCADE"))
+
+
+async def seed(years: int, events_per_day: int, active: int, users: int, per_user: int):
+    archived = years * 365 * events_per_day
+    plain, partitioned = SCHEMA.format("plain"), SCHEMA.format("partitioned")
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await drop_schemas(conn)
+        for layout in LAYOUTS:
+            for statement in create_tables_sql(SCHEMA.format(layout), layout == "partitioned"):
+                await conn.execute(text(statement))
+
+        # Архив равномерно за years лет до сегодняшнего дня, предстоящие — каждые 6 часов вперёд
+        await conn.execute(text(f"""
+            INSERT INTO {plain}.events (event_id, event_name, place, short_description, long_description,
+                                        max_count_of_members, format, date, tags, is_active)
+            SELECT g, 'Bench event ' || g, 'Online', 'Partition benchmark event',
+                   'Partition benchmark event description', 100, 'Online',
+                   CASE WHEN g <= :archived THEN now() - (:archived - g + 1) * make_interval(secs => :step)
+                        ELSE now() + (g - :archived) * interval '6 hours' END,
+                   'bench,topic-' || (1 + g % 50), g > :archived
+            FROM generate_series(1, :total) g
+        """), {"archived": archived, "total": archived + active, "step": 86400.0 / events_per_day})
+        await conn.execute(text(f"""
+            INSERT INTO {plain}.tags (tag_id, name)
+            SELECT 0, 'bench' UNION ALL SELECT g, 'topic-' || g FROM generate_series(1, 50) g
+        """))
+        await conn.execute(text(f"""
+            INSERT INTO {plain}.event_tags (event_id, tag_id, event_is_active)
+            SELECT event_id, 0, is_active FROM {plain}.events
+            UNION ALL SELECT event_id, 1 + event_id % 50, is_active FROM {plain}.events
+        """))
+        # Первая регистрация пользователя — на предстоящее мероприятие, остальные — в архиве
+        await conn.execute(text(f"""
+            INSERT INTO {plain}.registrations (id, user_id, event_id, event_is_active, time_of_registration)
+            SELECT row_number() OVER (), u, e.event_id, e.is_active, e.date - interval '1 day'
+            FROM generate_series(1, :users) u CROSS JOIN generate_series(1, :per_user) k
+            JOIN {plain}.events e ON e.event_id = CASE
+                WHEN k = 1 THEN :archived + 1 + u % :active
+                ELSE 1 + (u * 7919 + k * 104729) % :archived END
+            ON CONFLICT DO NOTHING
+        """), {"users": users, "per_user": per_user, "archived": archived, "active": active})
+        await conn.execute(text(f"""
+            UPDATE {plain}.events e SET registered_count = counts.total
+            FROM (SELECT event_id, count(*) AS total FROM {plain}.registrations GROUP BY event_id) counts
+            WHERE counts.event_id = e.event_id
+        """))
+
+        for table, columns in (
+            ("events", EVENT_COLUMNS),
+            ("tags", "tag_id, name"),
+            ("event_tags", "event_id, tag_id, event_is_active"),
+            ("registrations", "id, user_id, event_id, event_is_active, time_of_registration"),
+        ):
+            await conn.execute(text(
+                f"INSERT INTO {partitioned}.{table} ({columns}) SELECT {columns} FROM {plain}.{table}"
+            ))
+        for layout in LAYOUTS:
+            for statement in create_indexes_sql(SCHEMA.format(layout), layout == "partitioned"):
+                await conn.execute(text(statement))
+        totals = (await conn.execute(text(f"""
+            SELECT (SELECT count(*) FROM {plain}.events), (SELECT count(*) FROM {plain}.registrations),
+                   (SELECT count(*) FROM {plain}.registrations WHERE event_is_active)
+        """))).one()
+    print(f"seeded {totals[0]} events ({active} active, {years} years of archive), "
+          f"{totals[1]} registrations ({totals[2]} active) in {time.perf_counter() - started:.1f}s")
+    return {"events": totals[0], "active_events": active, "registrations": totals[1],
+            "active_registrations": totals[2], "years": years}
+
+
+def build_cases(sample: dict):
+    """(название, корутина) — как в scripts.explain_queries, по одной на ручку."""
+    page = DEFAULT_PAGE_SIZE + 1
+    return [
+        ("GET /events", lambda s: EventDAL(s).list_events(is_active=True, limit=page)),
+        ("GET /events?cursor=...", lambda s: EventDAL(s).list_events(
+            is_active=True, limit=page, after=sample["cursor"])),
+        ("GET /events?tags=...", lambda s: EventDAL(s).list_events(is_active=True, limit=page, tags=["topic-7"])),
+        ("GET /archived_events", lambda s: EventDAL(s).list_events(is_active=False, limit=page, descending=True)),
+        ("GET /events/search", lambda s: EventDAL(s).search_events("benchmark", limit=page)),
+        ("GET /tags", lambda s: TagDAL(s).get_active_tag_counts()),
+        ("GET /registration_status", lambda s: EventDAL(s).get_seat_statuses(sample["page_ids"], sample["user_id"])),
+        ("GET /cabinet", lambda s: RegistrationDAL(s).get_user_events(sample["user_id"])),
+        ("GET /user_events", lambda s: RegistrationDAL(s).get_user_events(sample["user_id"], is_active=True)),
+        ("GET /user_completed_events", lambda s: RegistrationDAL(s).get_user_events(
+            sample["user_id"], is_active=False)),
+        ("PATCH /archive_events/{id}", lambda s: EventDAL(s).archive_event(sample["event_id"])),
+    ]
+
+
+def plan_relations(plan: dict) -> set:
+    relations = {plan["Relation Name"]} if "Relation Name" in plan else set()
+    for child in plan.get("Plans", ()):
+        relations |= plan_relations(child)
+    return relations
+
+
+async def pick_sample(bind) -> dict:
+    async with AsyncSession(bind) as session:
+        page = await EventDAL(session).list_events(is_active=True, limit=DEFAULT_PAGE_SIZE + 1)
+        middle = page[len(page) // 2]
+        return {
+            "user_id": 1,
+            "event_id": page[0].event_id,
+            "page_ids": [row.event_id for row in page],
+            "cursor": (middle.date, middle.event_id),
+        }
+
+
+async def measure(layout: str, repeat: int) -> dict:
+    bind = engine.execution_options(schema_translate_map={None: SCHEMA.format(layout)})
+    sample = await pick_sample(bind)
+    captured = []
+    capturing = False
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if capturing:
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    results = {}
+    try:
+        async with AsyncSession(bind) as session:
+            for name, run in build_cases(sample):
+                timings = []
+                for attempt in range(repeat + 1):
+                    savepoint = await session.begin_nested()
+                    captured.clear()
+                    capturing = attempt == 0
+                    started = time.perf_counter()
+                    await run(session)
+                    elapsed = time.perf_counter() - started
+                    capturing = False
+                    if attempt == 0:
+                        # Первый прогон — прогрев; по нему же смотрим, какие таблицы остались в плане
+                        connection = await session.connection()
+                        relations = set()
+                        for statement, parameters in list(captured):
+                            plan = (await connection.exec_driver_sql(
+                                "EXPLAIN (FORMAT JSON) " + statement, parameters)).scalar()
+                            plan = json.loads(plan) if isinstance(plan, str) else plan
+                            relations |= plan_relations(plan[0]["Plan"])
+                    else:
+                        timings.append(elapsed * 1000)
+                    await savepoint.rollback()
+                timings.sort()
+                results[name] = {
+                    "p50": round(statistics.median(timings), 3),
+                    "p95": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+                    "relations": sorted(relations),
+                }
+            await session.rollback()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    return results
+
+
+def print_summary(layouts: dict, baseline: dict = None):
+    plain, partitioned = layouts["plain"], layouts["partitioned"]
+    print(f"\n{'query':30} {'plain p50':>10} {'part p50':>10} {'plain p95':>10} {'part p95':>10} {'speedup':>8}  relations")
+    for name, stats in partitioned.items():
+        before = plain[name]
+        speedup = before["p50"] / stats["p50"] if stats["p50"] else 0
+        print(f"{name:30} {before['p50']:>10.2f} {stats['p50']:>10.2f} {before['p95']:>10.2f} "
+              f"{stats['p95']:>10.2f} {speedup:>7.2f}x  {', '.join(stats['relations'])}")
+        previous = (baseline or {}).get("layouts", {}).get("partitioned", {}).get(name)
+        if previous:
+            print(f"{'  vs baseline':30} {'':>10} {stats['p50'] - previous['p50']:>+10.2f} {'':>10} "
+                  f"{stats['p95'] - previous['p95']:>+10.2f}")
+
+
+async def run(args):
+    try:
+        dataset = await seed(args.years, args.events_per_day, args.active, args.users, args.registrations_per_user)
+        layouts = {layout: await measure(layout, args.repeat) for layout in LAYOUTS}
+    finally:
+        if not args.keep:
+            async with engine.begin() as conn:
+                await drop_schemas(conn)
+        await engine.dispose()
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "repeat": args.repeat,
+            **dataset,
+        },
+        "layouts": layouts,
+    }
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_summary(layouts, baseline)
+
+    output = Path(args.output or f"bench/results/partitioning-{result['meta']['commit']}-{int(time.time())}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"results written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=5, help="сколько лет архива")
+    parser.add_argument("--events-per-day", type=int, default=30)
+    parser.add_argument("--active", type=int, default=300, help="предстоящие мероприятия")
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--registrations-per-user", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=50, help="замеров на запрос после прогрева")
+    parser.add_argument("--keep", action="store_true", help="не удалять схемы bench_plain и bench_partitioned")
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
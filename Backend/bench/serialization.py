@@ -0,0 +1,100 @@
+"""
+Микробенчмарк стоимости одной строки в списке мероприятий: чтение из БД плюс сборка JSON.
+
+Сравниваются два пути:
+  orm   — как было: select(Event) с полными ORM-объектами, EventCardPage через orm_mode и .json() pydantic;
+  lean  — как сейчас: только колонки карточки (EVENT_CARD_COLUMNS) строками и orjson без проверки схемы.
+
+База — SQLite в памяти из стандартной библиотеки: так замеряется только работа Python на строку,
+без сети и планировщика Postgres. Время запроса в Postgres смотрите в scripts.explain_queries.
+
+Запуск из папки Backend:
+    python -m bench.serialization [--rows 10000] [--repeat 7]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from api.fast_json import dumps
+from api.models import EventCardPage
+from db.dals import EVENT_CARD_COLUMNS
+from db.models import Event
+
+# Колонки events без генерируемого search_vector: он отложенный и в списки не попадает
+EVENTS_DDL = """
+    CREATE TABLE events (
+        event_id INTEGER PRIMARY KEY, event_name VARCHAR NOT NULL, place VARCHAR NOT NULL,
+        short_description VARCHAR, long_description VARCHAR, max_count_of_members INTEGER,
+        format VARCHAR, online_event_link VARCHAR, date DATETIME, tags VARCHAR, is_active BOOLEAN,
+        registered_count INTEGER NOT NULL DEFAULT 0, reminder_sent_at DATETIME
+    )
+"""
+
+
+def seed(engine, rows: int):
+    start = datetime(2026, 1, 1, 10, 0)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(EVENTS_DDL)
+        conn.execute(insert(Event.__table__), [
+            {
+                "event_id": i, "event_name": f"Мероприятие {i}", "place": "Онлайн",
+                "short_description": "Короткое описание мероприятия",
+                "long_description": "Подробное описание мероприятия. " * 20,
+                "max_count_of_members": 100, "format": "Online", "online_event_link": f"https://example.invalid/{i}",
+                "date": start + timedelta(hours=i), "tags": "python,backend", "is_active": True,
+                "registered_count": i % 100, "reminder_sent_at": None,
+            }
+            for i in range(1, rows + 1)
+        ])
+
+
+def orm_path(engine) -> bytes:
+    with Session(engine) as session:
+        events = session.execute(select(Event).where(Event.is_active == True)
+                                 .order_by(Event.date, Event.event_id)).scalars().all()
+        return EventCardPage(items=events, next_cursor=None).json().encode()
+
+
+def lean_path(engine) -> bytes:
+    with engine.connect() as conn:
+        events = conn.execute(select(*EVENT_CARD_COLUMNS).where(Event.is_active == True)
+                              .order_by(Event.date, Event.event_id)).all()
+        return dumps({"items": events, "next_cursor": None})
+
+
+def measure(path, engine, repeat: int) -> list:
+    path(engine)  # прогрев: кэш скомпилированных выражений, импорт валидаторов
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        path(engine)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    seed(engine, args.rows)
+
+    print(f"{args.rows} events, best of {args.repeat}\n")
+    print(f"{'path':8} {'best ms':>9} {'median ms':>10} {'us/row':>8} {'bytes':>10}")
+    results = {}
+    for name, path in (("orm", orm_path), ("lean", lean_path)):
+        timings = measure(path, engine, args.repeat)
+        results[name] = min(timings)
+        print(f"{name:8} {min(timings) * 1000:>9.1f} {statistics.median(timings) * 1000:>10.1f} "
+              f"{min(timings) / args.rows * 1e6:>8.2f} {len(path(engine)):>10}")
+    print(f"\nlean is {results['orm'] / results['lean']:.1f}x faster per row")
+
+
+if __name__ == "__main__":
+    main()
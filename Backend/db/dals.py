@@ -1,11 +1,32 @@
-from datetime import datetime
-from typing import Union
+from datetime import datetime, timedelta
+from typing import Union, List, Sequence, Optional
 from uuid import UUID
 
-from sqlalchemy import and_, update, select
+from sqlalchemy import and_, or_, update, select, insert, delete, func, tuple_, literal_column, literal, cast, String, exists, null
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.models import Event, User, Registration
+from db.models import Event, User, Registration, OutboxMessage, Image, ImageVariant, Tag, EventTag, SEARCH_CONFIG
+from db.settings import LIVE_COUNTS_CHANNEL
+
+# Колонки карточек в списках (api.models.EventCard, UserCard): списки читают их строками, без ORM-объектов
+EVENT_CARD_COLUMNS = (Event.event_id, Event.event_name, Event.short_description, Event.date, Event.place, Event.tags)
+# Дата в ключе лент: без coalesce строки без даты выпадали бы из сравнения (date, event_id) > курсор
+EVENT_SORT_DATE = func.coalesce(Event.date, literal_column("'infinity'::timestamp"))
+USER_CARD_COLUMNS = (User.user_id, User.name, User.telegram_id, User.email, User.role, User.telephone_number,
+                     User.course, User.university_group)
+
+
+def count_notification(sender: str):
+    """
+    pg_notify с новым счётчиком для RETURNING: уведомление уходит другим воркерам при коммите
+    и пропадает при откате, а отдельный запрос не нужен. Формат: "отправитель:event_id:счётчик".
+    """
+    payload = cast(literal(f"{sender}:"), String) + cast(Event.event_id, String) + ":" \
+        + cast(Event.registered_count, String)
+    return func.pg_notify(LIVE_COUNTS_CHANNEL, payload)
+
 
 class EventDAL:
     def __init__(self, db_session=AsyncSession):
@@ -45,13 +66,195 @@ class EventDAL:
         if updated_event_id_row is not None:
             return updated_event_id_row[0]
 
-    async def get_event_by_id(self, event_id: int) -> Union[Event, None]:
+    async def get_event_by_id(self, event_id: int, for_update: bool = False) -> Union[Event, None]:
         query = select(Event).where(Event.event_id == event_id)
+        if for_update:
+            query = query.with_for_update()
         res = await self.db_session.execute(query)
         event_row = res.fetchone()
         if event_row is not None:
             return event_row[0]
 
+    async def take_seat(self, event_id: int, notify_as: Optional[str] = None):
+        """
+        Атомарно занимает место на мероприятии: счётчик увеличивается, только если есть свободные места.
+        Строка мероприятия блокируется до конца транзакции, поэтому параллельные регистрации не превысят лимит.
+        notify_as — отправитель уведомления о новом счётчике (см. count_notification).
+        """
+        returning = [Event.event_id, Event.event_name, Event.long_description, Event.date, Event.place,
+                     Event.registered_count]
+        if notify_as is not None:
+            returning.append(count_notification(notify_as))
+        query = (
+            update(Event)
+            .where(
+                Event.event_id == event_id,
+                or_(Event.max_count_of_members.is_(None), Event.registered_count < Event.max_count_of_members),
+            )
+            .values(registered_count=Event.registered_count + 1)
+            .returning(*returning)
+            .execution_options(synchronize_session=False)
+        )
+        res = await self.db_session.execute(query)
+        return res.fetchone()
+
+    async def release_seat(self, event_id: int, notify_as: Optional[str] = None) -> Union[int, None]:
+        """Освобождает место и возвращает новый счётчик."""
+        returning = [Event.registered_count]
+        if notify_as is not None:
+            returning.append(count_notification(notify_as))
+        query = (
+            update(Event)
+            .where(Event.event_id == event_id, Event.registered_count > 0)
+            .values(registered_count=Event.registered_count - 1)
+            .returning(*returning)
+            .execution_options(synchronize_session=False)
+        )
+        res = await self.db_session.execute(query)
+        row = res.fetchone()
+        if row is not None:
+            return row.registered_count
+
+    async def claim_due_reminders(self, now: datetime, window_end: datetime):
+        """
+        Отмечает напоминание отправленным для всех активных мероприятий, которые вошли в окно напоминаний,
+        и возвращает их. Условие на reminder_sent_at не даёт отправить напоминание дважды.
+        """
+        query = (
+            update(Event)
+            .where(
+                Event.is_active == True,
+                Event.reminder_sent_at.is_(None),
+                Event.date > now,
+                Event.date <= window_end,
+            )
+            .values(reminder_sent_at=now)
+            .returning(Event.event_id, Event.event_name, Event.long_description, Event.date, Event.place)
+            .execution_options(synchronize_session=False)
+        )
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def get_registered_count(self, event_id: int) -> Union[int, None]:
+        query = select(Event.registered_count).where(Event.event_id == event_id)
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def get_seat_statuses(self, event_ids: Sequence[int], user_id: Optional[int] = None) -> List[Row]:
+        """
+        Счётчик, лимит мест и запись пользователя для набора мероприятий одним запросом:
+        счётчик берётся из events.registered_count, а запись проверяется по уникальному
+        (user_id, event_id) в registrations. Без user_id колонка registered_by_me равна NULL.
+        """
+        if user_id is None:
+            registered_by_me = null()
+        else:
+            registered_by_me = exists().where(Registration.event_id == Event.event_id,
+                                              Registration.event_is_active == Event.is_active,
+                                              Registration.user_id == user_id)
+        query = select(
+            Event.event_id, Event.registered_count, Event.max_count_of_members,
+            registered_by_me.label("registered_by_me"),
+        ).where(Event.event_id.in_(event_ids))
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def get_registered_counts(self, event_ids: Sequence[int]) -> List[Row]:
+        query = select(Event.event_id, Event.registered_count).where(Event.event_id.in_(event_ids))
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def list_events(
+            self, is_active: bool, limit: int, after: Optional[tuple] = None, descending: bool = False,
+            date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+            format: Optional[str] = None, tags: Optional[Sequence[str]] = None) -> List[Row]:
+        """
+        Страница карточек мероприятий по ключу (EVENT_SORT_DATE, event_id): after — (date, event_id)
+        последней строки предыдущей страницы, date может быть None. Возвращает строки с колонками
+        EVENT_CARD_COLUMNS.
+        """
+        query = select(*EVENT_CARD_COLUMNS).where(Event.is_active == is_active)
+        if date_from is not None:
+            query = query.where(Event.date >= date_from)
+        if date_to is not None:
+            query = query.where(Event.date <= date_to)
+        if format is not None:
+            query = query.where(Event.format == format)
+        # Мероприятие должно иметь все перечисленные теги
+        for tag in split_tags(",".join(tags or ())):
+            query = query.where(Event.event_id.in_(
+                select(EventTag.event_id).join(Tag, Tag.tag_id == EventTag.tag_id).where(Tag.name == tag)
+            ))
+        key = tuple_(EVENT_SORT_DATE, Event.event_id)
+        if after is not None:
+            after_date, after_id = after
+            after_key = tuple_(func.coalesce(after_date, literal_column("'infinity'::timestamp")), after_id)
+            query = query.where(key < after_key if descending else key > after_key)
+        if descending:
+            query = query.order_by(EVENT_SORT_DATE.desc(), Event.event_id.desc())
+        else:
+            query = query.order_by(EVENT_SORT_DATE, Event.event_id)
+        res = await self.db_session.execute(query.limit(limit))
+        return res.all()
+
+
+    async def search_events(self, query: str, limit: int, after: Optional[tuple] = None) -> List[Row]:
+        """
+        Активные мероприятия по полнотекстовому запросу, самые релевантные первыми.
+        Возвращает строки EVENT_CARD_COLUMNS с рангом в колонке rank; страница идёт по ключу
+        (ранг, event_id) после after.
+        """
+        ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), query)
+        rank = func.ts_rank_cd(Event.search_vector, ts_query)
+        statement = select(*EVENT_CARD_COLUMNS, rank.label("rank")).where(Event.is_active == True, Event.search_vector.op("@@")(ts_query))
+        if after is not None:
+            statement = statement.where(tuple_(rank, Event.event_id) < tuple_(*after))
+        statement = statement.order_by(rank.desc(), Event.event_id.desc()).limit(limit)
+        res = await self.db_session.execute(statement)
+        return res.all()
+
+
+def split_tags(tags: Optional[str]) -> List[str]:
+    """Строка тегов через запятую -> уникальные нормализованные имена в порядке сортировки."""
+    return sorted({" ".join(tag.split()).lower() for tag in (tags or "").split(",")} - {""})
+
+
+class TagDAL:
+    def __init__(self, db_session=AsyncSession):
+        self.db_session = db_session
+
+    async def set_event_tags(self, event_id: int, tags: Optional[str]):
+        """Приводит event_tags мероприятия в соответствие со строкой тегов; вызывается в той же транзакции."""
+        names = split_tags(tags)
+        await self.db_session.execute(delete(EventTag).where(EventTag.event_id == event_id))
+        if not names:
+            return
+        # Имена отсортированы, поэтому параллельные вставки одних и тех же тегов не взаимоблокируются
+        await self.db_session.execute(
+            pg_insert(Tag).values([{"name": name} for name in names]).on_conflict_do_nothing(index_elements=["name"])
+        )
+        # Статус мероприятия копируется в event_tags и дальше меняется каскадом при архивации
+        await self.db_session.execute(
+            insert(EventTag).from_select(
+                ["event_id", "event_is_active", "tag_id"],
+                select(Event.event_id, Event.is_active, Tag.tag_id)
+                .where(Event.event_id == event_id, Tag.name.in_(names))
+            )
+        )
+
+    async def get_active_tag_counts(self) -> List[tuple]:
+        """Пары (тег, число активных мероприятий) одним агрегирующим запросом, популярные первыми."""
+        events_count = func.count(EventTag.event_id)
+        query = (
+            select(Tag.name, events_count)
+            .join(EventTag, EventTag.tag_id == Tag.tag_id)
+            .where(EventTag.event_is_active == True)
+            .group_by(Tag.name)
+            .order_by(events_count.desc(), Tag.name)
+        )
+        res = await self.db_session.execute(query)
+        return res.all()
+
 
 class UserDAL:
     def __init__(self, db_session=AsyncSession):
@@ -95,6 +298,14 @@ class UserDAL:
         if user_row is not None:
             return user_row[0]
 
+    async def list_users(self, limit: int, after_id: Optional[int] = None) -> List[Row]:
+        """Строки с колонками USER_CARD_COLUMNS по возрастанию user_id."""
+        query = select(*USER_CARD_COLUMNS).order_by(User.user_id).limit(limit)
+        if after_id is not None:
+            query = query.where(User.user_id > after_id)
+        res = await self.db_session.execute(query)
+        return res.all()
+
 class AdminDAL():
     def __init__(self, db_session=AsyncSession):
         self.db_session = db_session
@@ -115,19 +326,215 @@ class RegistrationDAL():
     def __init__(self, db_session=AsyncSession):
         self.db_session = db_session
 
-    async def create_registration(
-            self, user_id, event_id,
-    ):
-        new_registrations = Registration(
-            user_id=user_id, event_id=event_id
+    async def create_registration(self, user_id: int, event_id: int) -> Union[int, None]:
+        """
+        Возвращает id новой регистрации или None, если пользователь уже зарегистрирован.
+        Ключ секции (статус мероприятия) берётся из events тем же запросом.
+        """
+        query = (
+            pg_insert(Registration)
+            .from_select(
+                ["user_id", "event_id", "event_is_active"],
+                select(literal(user_id), Event.event_id, Event.is_active).where(Event.event_id == event_id),
+            )
+            .on_conflict_do_nothing(constraint='uq_registrations_user_event')
+            .returning(Registration.id)
         )
-        self.db_session.add(new_registrations)
-        await self.db_session.flush()
-        return new_registrations
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def delete_registration(self, user_id: int, event_id: int) -> bool:
+        query = (
+            delete(Registration)
+            .where(Registration.event_id == event_id, Registration.user_id == user_id)
+            .returning(Registration.id)
+            .execution_options(synchronize_session=False)
+        )
+        res = await self.db_session.execute(query)
+        return res.fetchone() is not None
 
     async def get_user_in_registration_by_id(self, user_id: int) -> Union[User, None]:
         query = select(User).where(User.user_id == user_id)
         res = await self.db_session.execute(query)
         users_row = res.fetchone()
         if users_row is not None:
-            return users_row[0]
\ No newline at end of file
+            return users_row[0]
+
+    async def get_user_events(self, user_id: int, is_active: Optional[bool] = None) -> List[Row]:
+        """Мероприятия, на которые записан пользователь, по дате: event_id, event_name, date, is_active."""
+        query = (
+            select(Event.event_id, Event.event_name, Event.date, Event.is_active)
+            .join(Registration, and_(Registration.event_id == Event.event_id,
+                                     Registration.event_is_active == Event.is_active))
+            .where(Registration.user_id == user_id)
+            .order_by(Event.date, Event.event_id)
+        )
+        # Условие на обе таблицы, чтобы планировщик отбросил чужие секции и events, и registrations
+        if is_active is not None:
+            query = query.where(Event.is_active == is_active, Registration.event_is_active == is_active)
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def get_member_emails_for_events(self, event_ids: Sequence[int]) -> List[tuple]:
+        """Пары (event_id, email) участников сразу для нескольких мероприятий."""
+        if not event_ids:
+            return []
+        query = (
+            select(Registration.event_id, User.email)
+            .join(User, Registration.user_id == User.user_id)
+            .where(Registration.event_id.in_(event_ids))
+        )
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def stream_members(self, event_id: int, chunk_size: int):
+        """
+        Участники мероприятия через серверный курсор: строки приходят пачками по chunk_size,
+        и в памяти не держится весь список. Результат читается через .partitions().
+        """
+        query = (
+            select(User.name, User.email, User.university_group, User.course, Registration.time_of_registration)
+            .join(Registration, Registration.user_id == User.user_id)
+            .where(Registration.event_id == event_id)
+            .order_by(Registration.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        return await self.db_session.stream(query)
+
+    async def get_member_emails(self, event_id: int) -> List[str]:
+        query = (
+            select(User.email)
+            .join(Registration, Registration.user_id == User.user_id)
+            .where(Registration.event_id == event_id)
+        )
+        res = await self.db_session.execute(query)
+        return res.scalars().all()
+
+
+class OutboxDAL():
+    def __init__(self, db_session=AsyncSession):
+        self.db_session = db_session
+
+    async def enqueue(self, recipient: str, subject: str, body: str):
+        await self.enqueue_many([recipient], subject, body)
+
+    async def enqueue_many(self, recipients: Sequence[str], subject: str, body: str):
+        await self.enqueue_messages(
+            [{"recipient": recipient, "subject": subject, "body": body} for recipient in recipients]
+        )
+
+    async def enqueue_messages(self, messages: Sequence[dict]):
+        """Вставляет пачку писем (recipient, subject, body) одним запросом."""
+        if not messages:
+            return
+        await self.db_session.execute(insert(OutboxMessage), list(messages))
+
+    async def claim_batch(self, batch_size: int, lease_seconds: int):
+        """
+        Забирает пачку готовых к отправке писем. Письмо остаётся в статусе pending,
+        но откладывается на время аренды: если процесс упадёт, письмо снова станет доступным.
+        """
+        ready = (
+            select(OutboxMessage.id)
+            .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= func.now())
+            .order_by(OutboxMessage.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(ready.scalar_subquery()))
+            .values(
+                attempts=OutboxMessage.attempts + 1,
+                next_attempt_at=func.now() + timedelta(seconds=lease_seconds),
+            )
+            .returning(OutboxMessage.id, OutboxMessage.recipient, OutboxMessage.subject, OutboxMessage.body,
+                       OutboxMessage.attempts,
+                       func.extract("epoch", func.now() - OutboxMessage.created_at).label("queued_seconds"))
+            .execution_options(synchronize_session=False)
+        )
+        res = await self.db_session.execute(query)
+        return res.all()
+
+    async def mark_sent(self, message_ids: Sequence[int]):
+        if not message_ids:
+            return
+        query = (
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(message_ids))
+            .values(status="sent", sent_at=func.now(), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db_session.execute(query)
+
+    async def mark_failed(self, message_id: int, error: str, retry_in_seconds: Union[int, None]):
+        """Откладывает письмо на retry_in_seconds, а при None переводит его в failed."""
+        values = {"last_error": error}
+        if retry_in_seconds is None:
+            values["status"] = "failed"
+        else:
+            values["next_attempt_at"] = func.now() + timedelta(seconds=retry_in_seconds)
+        query = (
+            update(OutboxMessage)
+            .where(OutboxMessage.id == message_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db_session.execute(query)
+
+
+class ImageDAL():
+    def __init__(self, db_session=AsyncSession):
+        self.db_session = db_session
+
+    async def create_image(self, event_id: int, sha256: str, content_type: str, size: int) -> Image:
+        new_image = Image(event_id=event_id, sha256=sha256, content_type=content_type, size=size)
+        self.db_session.add(new_image)
+        await self.db_session.flush()
+        return new_image
+
+    async def create_variants(self, image_id: int, variants: Sequence[dict]):
+        if not variants:
+            return
+        await self.db_session.execute(
+            insert(ImageVariant), [{"image_id": image_id, **variant} for variant in variants]
+        )
+
+    async def get_image_by_event_id(self, event_id: int) -> Union[Image, None]:
+        query = select(Image).where(Image.event_id == event_id).order_by(Image.id.desc()).limit(1)
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def get_variant(self, event_id: int, size: str, format: str):
+        """Возвращает (sha256, content_type) нужного варианта последней картинки мероприятия."""
+        latest_image = (
+            select(Image.id).where(Image.event_id == event_id).order_by(Image.id.desc()).limit(1).scalar_subquery()
+        )
+        query = select(ImageVariant.sha256, ImageVariant.content_type).where(
+            ImageVariant.image_id == latest_image, ImageVariant.size == size, ImageVariant.format == format,
+        )
+        res = await self.db_session.execute(query)
+        return res.fetchone()
+
+    async def delete_event_images(self, event_id: int) -> List[str]:
+        """Удаляет записи о картинках мероприятия вместе с вариантами и возвращает хеши их файлов."""
+        image_ids = select(Image.id).where(Image.event_id == event_id).scalar_subquery()
+        res = await self.db_session.execute(
+            delete(ImageVariant).where(ImageVariant.image_id.in_(image_ids)).returning(ImageVariant.sha256)
+            .execution_options(synchronize_session=False)
+        )
+        digests = res.scalars().all()
+        res = await self.db_session.execute(
+            delete(Image).where(Image.event_id == event_id).returning(Image.sha256)
+            .execution_options(synchronize_session=False)
+        )
+        return digests + res.scalars().all()
+
+    async def get_referenced_hashes(self, digests: Sequence[str]) -> set:
+        if not digests:
+            return set()
+        query = select(Image.sha256).where(Image.sha256.in_(digests)).union(
+            select(ImageVariant.sha256).where(ImageVariant.sha256.in_(digests))
+        )
+        res = await self.db_session.execute(query)
+        return set(res.scalars().all())
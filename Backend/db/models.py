@@ -1,12 +1,55 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, func, LargeBinary, text
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, func, text, UniqueConstraint, Index, \
+    Computed, PrimaryKeyConstraint, ForeignKeyConstraint, DDL
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.event import listen
+from sqlalchemy.orm import declarative_base, relationship, deferred
 
 Base = declarative_base()
 
+SEARCH_CONFIG = 'russian'
+
+# Вес полей в поиске: название важнее тегов и краткого описания, полное описание — меньше всего
+EVENT_SEARCH_VECTOR = " || ".join(
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{weight}')"
+    for column, weight in (
+        ("event_name", "A"),
+        ("tags", "B"),
+        ("short_description", "B"),
+        ("place", "C"),
+        ("long_description", "D"),
+    )
+)
+
+# Секции по статусу мероприятия: таблица -> {секция: значение ключа}. В metadata их нет —
+# на рабочей базе их создаёт ревизия 0009, при create_all — DDL после создания таблицы (в конце
+# модуля), а autogenerate пропускает их по PARTITION_TABLES (migrations/env.py).
+PARTITIONS = {
+    'events': {'events_active': 'true', 'events_archived': 'false'},
+    'registrations': {'registrations_active': 'true', 'registrations_archived': 'false'},
+}
+PARTITION_TABLES = frozenset(partition for partitions in PARTITIONS.values() for partition in partitions)
+
 
 class Event(Base):
+    """
+    Таблица секционирована по is_active (см. PARTITIONS): активные мероприятия лежат в events_active,
+    архив — в events_archived, и запросы с условием на is_active читают только свою секцию.
+    Архивация переносит строку между секциями, а регистрации и теги переезжают следом
+    по внешним ключам с ON UPDATE CASCADE (Postgres 15+, см. ревизию 0009).
+    """
     __tablename__ = 'events'
-    event_id = Column(Integer, primary_key=True)
+    __table_args__ = (
+        # Ключ секционирования обязан входить в первичный ключ; event_id уникален сам по себе (sequence)
+        PrimaryKeyConstraint('event_id', 'is_active'),
+        # Ленты идут по (дата, event_id) внутри секции своего статуса; мероприятия без даты — как самые
+        # поздние, чтобы ключ курсора не был NULL (db.dals.EVENT_SORT_DATE)
+        Index('ix_events_sort_date', text("coalesce(date, 'infinity'::timestamp)"), 'event_id'),
+        # Мероприятия, по которым ещё не разослали напоминание
+        Index('ix_events_reminder_due', 'date', postgresql_where=text('is_active AND reminder_sent_at IS NULL')),
+        Index('ix_events_search_vector', 'search_vector', postgresql_using='gin'),
+        {'postgresql_partition_by': 'LIST (is_active)'},
+    )
+    event_id = Column(Integer, autoincrement=True)
     event_name = Column(String, nullable=False)
     place = Column(String, nullable=False)
     short_description = Column(String, nullable=True)
@@ -16,15 +59,49 @@ class Event(Base):
     online_event_link = Column(String, nullable=True, default=None)
     date = Column(DateTime, nullable=True, server_default=func.now())
     tags = Column(String, nullable=True)
-    is_active = Column(Boolean, default = True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    # Счётчик регистраций, обновляется вместе с таблицей registrations
+    registered_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Когда ушло напоминание; сбрасывается при переносе даты
+    reminder_sent_at = Column(DateTime, nullable=True)
+    # Полнотекстовый поиск: вычисляется Postgres при каждой записи строки
+    search_vector = deferred(Column(TSVECTOR, Computed(EVENT_SEARCH_VECTOR, persisted=True)))
     registrations = relationship('Registration', back_populates='event')
 
+    # Для ORM мероприятие определяется одним event_id, is_active в ключе нужен только Postgres
+    __mapper_args__ = {'primary_key': [event_id]}
+
+class Tag(Base):
+    __tablename__ = 'tags'
+    tag_id = Column(Integer, primary_key=True)
+    # Нормализованное имя: нижний регистр, без лишних пробелов (см. db.dals.split_tags)
+    name = Column(String, nullable=False, unique=True)
+
+
+class EventTag(Base):
+    __tablename__ = 'event_tags'
+    # Первичный ключ (event_id, tag_id) покрывает теги мероприятия, обратный индекс — мероприятия по тегу
+    __table_args__ = (
+        Index('ix_event_tags_tag_id', 'tag_id', 'event_id'),
+        ForeignKeyConstraint(['event_id', 'event_is_active'], ['events.event_id', 'events.is_active'],
+                             ondelete='CASCADE', onupdate='CASCADE'),
+    )
+    event_id = Column(Integer, primary_key=True)
+    tag_id = Column(Integer, ForeignKey('tags.tag_id', ondelete='CASCADE'), primary_key=True)
+    # Копия events.is_active: счётчики тегов активных мероприятий считаются без обращения к events
+    event_is_active = Column(Boolean, nullable=False)
+
+
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_confirmation_token', 'confirmation_token', unique=True,
+              postgresql_where=text('confirmation_token IS NOT NULL')),
+    )
     user_id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     telegram_id = Column(String, nullable=True)
-    email = Column(String, nullable=False)
+    email = Column(String, nullable=False, unique=True, index=True)
     hashed_password = Column(String, nullable=False)
     role =Column(String, nullable=False)
     telephone_number = Column(String, nullable=True, default=None)
@@ -36,19 +113,79 @@ class User(Base):
 
 
 class Registration(Base):
+    """Секционирована по статусу мероприятия вместе с events, см. Event."""
     __tablename__ = 'registrations'
-    id = Column(Integer, primary_key=True)
+    __table_args__ = (
+        PrimaryKeyConstraint('id', 'event_is_active'),
+        # Уникальный (user_id, event_id) заодно служит индексом для выборок по user_id;
+        # статус мероприятия у всех его регистраций один, так что уникальность пары сохраняется
+        UniqueConstraint('user_id', 'event_id', 'event_is_active', name='uq_registrations_user_event'),
+        ForeignKeyConstraint(['event_id', 'event_is_active'], ['events.event_id', 'events.is_active'],
+                             onupdate='CASCADE'),
+        {'postgresql_partition_by': 'LIST (event_is_active)'},
+    )
+    id = Column(Integer, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.user_id'))
-    event_id = Column(Integer, ForeignKey('events.event_id'))
+    event_id = Column(Integer, nullable=False, index=True)
+    # Копия events.is_active — ключ секционирования; меняется каскадом при архивации
+    event_is_active = Column(Boolean, nullable=False)
     time_of_registration = Column(DateTime, server_default=text("timezone('Europe/Moscow', now())"))
     user = relationship('User', back_populates='registrations')
     event = relationship('Event', back_populates='registrations')
 
+    __mapper_args__ = {'primary_key': [id]}
+
 class Image(Base):
     __tablename__ = 'images'
     id = Column(Integer, primary_key=True)
-    event_id = Column(Integer, ForeignKey('events.event_id'))
-    data = Column(LargeBinary, nullable=False)
+    # Без внешнего ключа: на секционированную events можно ссылаться только парой (event_id, is_active).
+    # Картинки удаляются вместе с мероприятием в delete_event
+    event_id = Column(Integer, index=True)
+    # Сам файл лежит в ImageStore по своему sha256, в БД только метаданные
+    sha256 = Column(String(64), nullable=False, index=True)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    variants = relationship('ImageVariant', back_populates='image')
+
+
+class ImageVariant(Base):
+    """Заранее посчитанная уменьшенная копия картинки в одном из веб-форматов"""
+    __tablename__ = 'image_variants'
+    __table_args__ = (UniqueConstraint('image_id', 'size', 'format', name='uq_image_variants_image_size_format'),)
+    id = Column(Integer, primary_key=True)
+    image_id = Column(Integer, ForeignKey('images.id'), nullable=False)
+    size = Column(String, nullable=False)
+    format = Column(String, nullable=False)
+    sha256 = Column(String(64), nullable=False, index=True)
+    content_type = Column(String, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    image = relationship('Image', back_populates='variants')
 
 
+class OutboxMessage(Base):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        # Диспетчер смотрит только на ожидающие письма, отправленные в индекс не попадают
+        Index('ix_outbox_pending_next_attempt', 'next_attempt_at', postgresql_where=text("status = 'pending'")),
+    )
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    # pending -> sent, либо failed после исчерпания попыток
+    status = Column(String, nullable=False, default="pending", server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now())
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+
 
+for _table, _partitions in PARTITIONS.items():
+    for _partition, _value in _partitions.items():
+        listen(Base.metadata.tables[_table], 'after_create', DDL(
+            f"CREATE TABLE {_partition} PARTITION OF {_table} FOR VALUES IN ({_value})"
+        ).execute_if(dialect='postgresql'))
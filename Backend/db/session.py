@@ -3,11 +3,30 @@ from typing import Generator
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
-from db.settings import DATABASE_URL
+from api.metrics import instrument_engine, instrumented_pool
+from api.query_budget import install_query_counter
+from api.slow_queries import install_slow_query_log
+from db.settings import DATABASE, DATABASE_REPLICA, SLOW_QUERY_LOG
 
-engine = create_async_engine(DATABASE_URL, future=True, echo=True)
+engine = create_async_engine(DATABASE.url, future=True, poolclass=instrumented_pool("primary"),
+                             **DATABASE.engine_kwargs())
+instrument_engine(engine, "primary")
+install_query_counter(engine)
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+# Движок для чтения: реплика, если задана, иначе та же основная база
+if DATABASE_REPLICA:
+    read_engine = create_async_engine(DATABASE_REPLICA.url, future=True, poolclass=instrumented_pool("replica"),
+                                      **DATABASE_REPLICA.engine_kwargs())
+    instrument_engine(read_engine, "replica")
+    install_query_counter(read_engine)
+else:
+    read_engine = engine
+async_read_session = sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+
+if SLOW_QUERY_LOG:
+    install_slow_query_log((engine, "primary"), *([(read_engine, "replica")] if DATABASE_REPLICA else []))
+
 async def get_db() -> Generator:
     """Dependency for getting async session"""
     try:
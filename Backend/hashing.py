@@ -1,6 +1,16 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from db.settings import BCRYPT_ROUNDS, HASHING_WORKERS
+
+# При смене BCRYPT_ROUNDS старые хеши считаются устаревшими и пересчитываются при входе
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt отпускает GIL, поэтому ограниченного пула потоков достаточно, чтобы не блокировать event loop
+hashing_executor = ThreadPoolExecutor(max_workers=HASHING_WORKERS, thread_name_prefix="bcrypt")
 
 class Hasher:
     @staticmethod
@@ -9,4 +19,25 @@ class Hasher:
 
     @staticmethod
     def get_password_hash(password: str) -> str:
-        return pwd_context.hash(password)
\ No newline at end of file
+        return pwd_context.hash(password)
+
+class AsyncHasher:
+    """Те же операции, что и у Hasher, но выполняются в пуле потоков, а не в event loop."""
+
+    @staticmethod
+    async def _run(func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(hashing_executor, func, *args)
+
+    @staticmethod
+    async def verify_password(plain_password: str, hashed_password: str) -> bool:
+        return await AsyncHasher._run(pwd_context.verify, plain_password, hashed_password)
+
+    @staticmethod
+    async def get_password_hash(password: str) -> str:
+        return await AsyncHasher._run(pwd_context.hash, password)
+
+    @staticmethod
+    async def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Проверяет пароль и возвращает новый хеш, если параметры bcrypt изменились."""
+        return await AsyncHasher._run(pwd_context.verify_and_update, plain_password, hashed_password)
@@ -0,0 +1,76 @@
+"""baseline: схема до появления истории миграций
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+Базы, созданные раньше через autogenerate, помечаются этой ревизией командой
+alembic stamp 0001, после чего накатываются обычным alembic upgrade head.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'events',
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('event_name', sa.String(), nullable=False),
+        sa.Column('place', sa.String(), nullable=False),
+        sa.Column('short_description', sa.String(), nullable=True),
+        sa.Column('long_description', sa.String(), nullable=True),
+        sa.Column('max_count_of_members', sa.Integer(), nullable=True),
+        sa.Column('format', sa.String(), nullable=True),
+        sa.Column('online_event_link', sa.String(), nullable=True),
+        sa.Column('date', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('tags', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('event_id'),
+    )
+    op.create_table(
+        'users',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('telegram_id', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('telephone_number', sa.String(), nullable=True),
+        sa.Column('course', sa.Integer(), nullable=True),
+        sa.Column('university_group', sa.String(), nullable=True),
+        sa.Column('confirmation_token', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_table(
+        'images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['event_id'], ['events.event_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'registrations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('event_id', sa.Integer(), nullable=True),
+        sa.Column('time_of_registration', sa.DateTime(),
+                  server_default=sa.text("timezone('Europe/Moscow', now())"), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['events.event_id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('registrations')
+    op.drop_table('images')
+    op.drop_table('users')
+    op.drop_table('events')
@@ -0,0 +1,39 @@
+"""счётчик мест и уникальная регистрация
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:10:00
+
+Повторные регистрации одного пользователя на одно мероприятие, которые могли
+накопиться до появления ограничения, удаляются (остаётся самая ранняя), после
+чего счётчик заполняется по фактическому числу регистраций.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        DELETE FROM registrations r
+        USING registrations earlier
+        WHERE r.user_id = earlier.user_id AND r.event_id = earlier.event_id AND r.id > earlier.id
+    """)
+    op.create_unique_constraint('uq_registrations_user_event', 'registrations', ['user_id', 'event_id'])
+
+    op.add_column('events', sa.Column('registered_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE events e SET registered_count = counts.total
+        FROM (SELECT event_id, count(*) AS total FROM registrations GROUP BY event_id) counts
+        WHERE counts.event_id = e.event_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('events', 'registered_count')
+    op.drop_constraint('uq_registrations_user_event', 'registrations', type_='unique')
@@ -0,0 +1,77 @@
+"""картинки в файловом хранилище и их варианты
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:15:00
+
+Перенос блобов из images.data на диск делает python -m scripts.migrate_images_to_store:
+он долгий и пишет файлы, поэтому в миграцию не встроен. Если в images ещё лежат
+не перенесённые картинки, миграция останавливается и просит сначала запустить скрипт.
+На пустой базе колонка data просто удаляется.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def _image_columns() -> set:
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns('images')}
+
+
+def upgrade() -> None:
+    if context.is_offline_mode():
+        # В режиме --sql базы нет: считаем, что скрипт переноса уже отработал
+        op.execute("ALTER TABLE images DROP COLUMN IF EXISTS data")
+        columns = set()
+    else:
+        columns = _image_columns()
+    if 'data' in columns:
+        bind = op.get_bind()
+        # Колонка могла остаться после запуска скрипта с --keep-blobs: тогда всё уже перенесено
+        not_moved = "WHERE sha256 IS NULL" if 'sha256' in columns else ""
+        pending = bind.execute(sa.text(f"SELECT count(*) FROM images {not_moved}")).scalar()
+        if pending:
+            raise RuntimeError(
+                f"images.data still holds {pending} images: run `python -m scripts.migrate_images_to_store` "
+                "and then `alembic upgrade head` again"
+            )
+        op.drop_column('images', 'data')
+
+    # Скрипт переноса мог уже добавить эти колонки
+    op.execute("ALTER TABLE images ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64)")
+    op.execute("ALTER TABLE images ADD COLUMN IF NOT EXISTS content_type VARCHAR")
+    op.execute("ALTER TABLE images ADD COLUMN IF NOT EXISTS size INTEGER")
+    op.execute("ALTER TABLE images ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT now()")
+    for column in ('sha256', 'content_type', 'size', 'created_at'):
+        op.alter_column('images', column, nullable=False)
+
+    op.create_table(
+        'image_variants',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('image_id', sa.Integer(), nullable=False),
+        sa.Column('size', sa.String(), nullable=False),
+        sa.Column('format', sa.String(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('content_type', sa.String(), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=False),
+        sa.Column('height', sa.Integer(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['image_id'], ['images.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('image_id', 'size', 'format', name='uq_image_variants_image_size_format'),
+    )
+
+
+def downgrade() -> None:
+    # Файлы остаются в хранилище; обратно в БД блобы не возвращаются
+    op.drop_table('image_variants')
+    op.drop_column('images', 'created_at')
+    op.drop_column('images', 'size')
+    op.drop_column('images', 'content_type')
+    op.drop_column('images', 'sha256')
+    op.add_column('images', sa.Column('data', sa.LargeBinary(), nullable=True))
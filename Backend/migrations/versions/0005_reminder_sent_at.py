@@ -0,0 +1,30 @@
+"""состояние напоминаний в events
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:20:00
+
+Мероприятиям, которые уже попали в окно напоминаний, напоминание ставилось
+старым планировщиком, поэтому они сразу помечаются отправленными. Окно берётся из
+REMINDER_LEAD_HOURS на момент запуска миграции — то же, что потом использует рассылка.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from db.settings import REMINDER_LEAD_HOURS
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('events', sa.Column('reminder_sent_at', sa.DateTime(), nullable=True))
+    op.execute(f"UPDATE events SET reminder_sent_at = now() "
+               f"WHERE date <= now() + interval '{REMINDER_LEAD_HOURS} hours'")
+
+
+def downgrade() -> None:
+    op.drop_column('events', 'reminder_sent_at')
@@ -0,0 +1,57 @@
+"""индексы под запросы ручек
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:30:00
+
+Индексы строятся с CONCURRENTLY вне транзакции, чтобы не блокировать запись
+в рабочей базе. Если уникальный индекс по email не строится из-за дублей,
+их нужно разобрать вручную: миграция пользователей не удаляет.
+Проверить планы запросов: python -m scripts.explain_queries
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+# (имя, таблица, колонки, уникальный, условие частичного индекса)
+INDEXES = [
+    # Пользователь ищется по email на каждом авторизованном запросе
+    ('ix_users_email', 'users', ['email'], True, None),
+    ('ix_users_confirmation_token', 'users', ['confirmation_token'], True, 'confirmation_token IS NOT NULL'),
+    # registrations.user_id покрыт уникальным (user_id, event_id) из ревизии 0003
+    ('ix_registrations_event_id', 'registrations', ['event_id'], False, None),
+    ('ix_events_active_date', 'events', ['date', 'event_id'], False, 'is_active'),
+    ('ix_events_archived_date', 'events', ['date', 'event_id'], False, 'NOT is_active'),
+    ('ix_events_reminder_due', 'events', ['date'], False, 'is_active AND reminder_sent_at IS NULL'),
+    ('ix_outbox_pending_next_attempt', 'outbox', ['next_attempt_at'], False, "status = 'pending'"),
+    ('ix_images_event_id', 'images', ['event_id'], False, None),
+    ('ix_images_sha256', 'images', ['sha256'], False, None),
+    ('ix_image_variants_sha256', 'image_variants', ['sha256'], False, None),
+]
+
+
+def upgrade() -> None:
+    duplicates = [] if context.is_offline_mode() else op.get_bind().execute(sa.text(
+        "SELECT email FROM users GROUP BY email HAVING count(*) > 1 ORDER BY email"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"users.email is not unique, resolve these accounts first: {', '.join(duplicates)}")
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=unique, postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, *_ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""полнотекстовый поиск по мероприятиям
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 13:00:00
+
+Генерируемая колонка заполняется при добавлении, и таблица events переписывается
+под эксклюзивной блокировкой; events небольшая, но на рабочей базе миграцию лучше
+запускать вне пиковой нагрузки. GIN-индекс строится с CONCURRENTLY.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+# Копия db.models.EVENT_SEARCH_VECTOR на момент ревизии
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(event_name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(short_description, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(place, '')), 'C') || "
+    "setweight(to_tsvector('russian', coalesce(long_description, '')), 'D')"
+)
+
+
+def upgrade() -> None:
+    op.add_column('events', sa.Column(
+        'search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True),
+    ))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_events_search_vector', 'events', ['search_vector'], postgresql_using='gin',
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_events_search_vector', table_name='events', postgresql_concurrently=True)
+    op.drop_column('events', 'search_vector')
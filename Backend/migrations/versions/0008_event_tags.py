@@ -0,0 +1,61 @@
+"""теги мероприятий в отдельных таблицах
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 13:30:00
+
+Строка events.tags остаётся как есть (её показывают карточки и по ней ищет поиск),
+а для фильтров и счётчиков теги раскладываются в tags/event_tags. Нормализация
+та же, что в db.dals.split_tags: нижний регистр и схлопнутые пробелы.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+NORMALIZED_TAG = "lower(btrim(regexp_replace(tag, '\\s+', ' ', 'g')))"
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tags',
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('tag_id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_table(
+        'event_tags',
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['event_id'], ['events.event_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tag_id'], ['tags.tag_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('event_id', 'tag_id'),
+    )
+    op.create_index('ix_event_tags_tag_id', 'event_tags', ['tag_id', 'event_id'])
+
+    op.execute(f"""
+        INSERT INTO tags (name)
+        SELECT DISTINCT {NORMALIZED_TAG}
+        FROM events CROSS JOIN LATERAL regexp_split_to_table(events.tags, ',') AS tag
+        WHERE {NORMALIZED_TAG} <> ''
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute(f"""
+        INSERT INTO event_tags (event_id, tag_id)
+        SELECT DISTINCT events.event_id, tags.tag_id
+        FROM events CROSS JOIN LATERAL regexp_split_to_table(events.tags, ',') AS tag
+        JOIN tags ON tags.name = {NORMALIZED_TAG}
+    """)
+    op.execute("ANALYZE tags, event_tags")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_event_tags_tag_id', table_name='event_tags')
+    op.drop_table('event_tags')
+    op.drop_table('tags')
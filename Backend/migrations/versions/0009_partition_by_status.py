@@ -0,0 +1,188 @@
+"""секционирование events и registrations по статусу мероприятия
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 14:00:00
+
+events делится на events_active и events_archived по is_active, registrations — на
+registrations_active и registrations_archived по новой колонке event_is_active (копия статуса
+мероприятия). Архивация — обычный UPDATE is_active: Postgres переносит строку в другую секцию,
+а регистрации и event_tags переезжают следом по внешним ключам с ON UPDATE CASCADE.
+Каскад при переносе строки между секциями работает только с Postgres 15, поэтому на более
+старой версии миграция останавливается.
+
+Обе таблицы пересоздаются и копируются под эксклюзивной блокировкой — на время миграции
+мероприятия и регистрации недоступны, накатывать её нужно в окно обслуживания.
+Мероприятия с is_active = NULL (в списки не попадали) уходят в архив.
+На секционированную events можно ссылаться только парой (event_id, is_active), поэтому
+внешний ключ images.event_id удаляется: картинки и так удаляются в delete_event.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+# Копия db.models.EVENT_SEARCH_VECTOR на момент ревизии
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(event_name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(short_description, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(place, '')), 'C') || "
+    "setweight(to_tsvector('russian', coalesce(long_description, '')), 'D')"
+)
+
+EVENT_COLUMNS = ("event_id, event_name, place, short_description, long_description, max_count_of_members, "
+                 "format, online_event_link, date, tags, is_active, registered_count, reminder_sent_at")
+
+
+def _create_events(name: str, partitioned: bool):
+    op.execute(f"""
+        CREATE TABLE {name} (
+            event_id INTEGER NOT NULL DEFAULT nextval('events_event_id_seq'),
+            event_name VARCHAR NOT NULL,
+            place VARCHAR NOT NULL,
+            short_description VARCHAR,
+            long_description VARCHAR,
+            max_count_of_members INTEGER,
+            format VARCHAR,
+            online_event_link VARCHAR,
+            date TIMESTAMP WITHOUT TIME ZONE DEFAULT now(),
+            tags VARCHAR,
+            is_active BOOLEAN{' NOT NULL' if partitioned else ''},
+            registered_count INTEGER NOT NULL DEFAULT 0,
+            reminder_sent_at TIMESTAMP WITHOUT TIME ZONE,
+            search_vector TSVECTOR GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED
+        ){' PARTITION BY LIST (is_active)' if partitioned else ''}
+    """)
+
+
+def _create_registrations(name: str, partitioned: bool):
+    op.execute(f"""
+        CREATE TABLE {name} (
+            id INTEGER NOT NULL DEFAULT nextval('registrations_id_seq'),
+            user_id INTEGER,
+            event_id INTEGER{' NOT NULL' if partitioned else ''},
+            {'event_is_active BOOLEAN NOT NULL,' if partitioned else ''}
+            time_of_registration TIMESTAMP WITHOUT TIME ZONE DEFAULT timezone('Europe/Moscow', now())
+        ){' PARTITION BY LIST (event_is_active)' if partitioned else ''}
+    """)
+
+
+def _detach_sequences():
+    # Иначе DROP TABLE старой таблицы удалит и sequence вместе со счётчиком id
+    op.execute("ALTER SEQUENCE events_event_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE registrations_id_seq OWNED BY NONE")
+
+
+def _attach_sequences():
+    op.execute("ALTER SEQUENCE events_event_id_seq OWNED BY events.event_id")
+    op.execute("ALTER SEQUENCE registrations_id_seq OWNED BY registrations.id")
+
+
+def upgrade() -> None:
+    if not context.is_offline_mode():
+        bind = op.get_bind()
+        if int(bind.execute(sa.text("SHOW server_version_num")).scalar()) < 150000:
+            raise RuntimeError("partitioned events need PostgreSQL 15+: cascading a cross-partition "
+                               "UPDATE to referencing rows is not supported before it")
+        orphans = bind.execute(sa.text("SELECT count(*) FROM registrations WHERE event_id IS NULL")).scalar()
+        if orphans:
+            raise RuntimeError(f"{orphans} registrations have no event_id, delete them first")
+
+    op.execute("LOCK TABLE events, registrations, event_tags, images IN ACCESS EXCLUSIVE MODE")
+    op.drop_constraint('images_event_id_fkey', 'images', type_='foreignkey')
+    op.drop_constraint('event_tags_event_id_fkey', 'event_tags', type_='foreignkey')
+    _detach_sequences()
+
+    _create_events('events_partitioned', partitioned=True)
+    op.execute("CREATE TABLE events_active PARTITION OF events_partitioned FOR VALUES IN (true)")
+    op.execute("CREATE TABLE events_archived PARTITION OF events_partitioned FOR VALUES IN (false)")
+    op.execute(f"""
+        INSERT INTO events_partitioned ({EVENT_COLUMNS})
+        SELECT {EVENT_COLUMNS.replace('is_active', 'coalesce(is_active, false)')} FROM events
+    """)
+
+    _create_registrations('registrations_partitioned', partitioned=True)
+    op.execute("CREATE TABLE registrations_active PARTITION OF registrations_partitioned FOR VALUES IN (true)")
+    op.execute("CREATE TABLE registrations_archived PARTITION OF registrations_partitioned FOR VALUES IN (false)")
+    op.execute("""
+        INSERT INTO registrations_partitioned (id, user_id, event_id, event_is_active, time_of_registration)
+        SELECT r.id, r.user_id, r.event_id, e.is_active, r.time_of_registration
+        FROM registrations r JOIN events_partitioned e ON e.event_id = r.event_id
+    """)
+
+    op.drop_table('registrations')
+    op.drop_table('events')
+    op.rename_table('events_partitioned', 'events')
+    op.rename_table('registrations_partitioned', 'registrations')
+    _attach_sequences()
+
+    op.create_primary_key('events_pkey', 'events', ['event_id', 'is_active'])
+    op.create_index('ix_events_date', 'events', ['date', 'event_id'])
+    op.create_index('ix_events_reminder_due', 'events', ['date'],
+                    postgresql_where=sa.text('is_active AND reminder_sent_at IS NULL'))
+    op.create_index('ix_events_search_vector', 'events', ['search_vector'], postgresql_using='gin')
+
+    op.create_primary_key('registrations_pkey', 'registrations', ['id', 'event_is_active'])
+    op.create_unique_constraint('uq_registrations_user_event', 'registrations',
+                                ['user_id', 'event_id', 'event_is_active'])
+    op.create_index('ix_registrations_event_id', 'registrations', ['event_id'])
+    op.create_foreign_key('registrations_event_id_event_is_active_fkey', 'registrations', 'events',
+                          ['event_id', 'event_is_active'], ['event_id', 'is_active'], onupdate='CASCADE')
+    op.create_foreign_key('registrations_user_id_fkey', 'registrations', 'users', ['user_id'], ['user_id'])
+
+    op.add_column('event_tags', sa.Column('event_is_active', sa.Boolean(), nullable=True))
+    op.execute("""
+        UPDATE event_tags SET event_is_active = events.is_active
+        FROM events WHERE events.event_id = event_tags.event_id
+    """)
+    op.alter_column('event_tags', 'event_is_active', nullable=False)
+    op.create_foreign_key('event_tags_event_id_event_is_active_fkey', 'event_tags', 'events',
+                          ['event_id', 'event_is_active'], ['event_id', 'is_active'],
+                          onupdate='CASCADE', ondelete='CASCADE')
+    op.execute("ANALYZE events, registrations, event_tags")
+
+
+def downgrade() -> None:
+    op.execute("LOCK TABLE events, registrations, event_tags, images IN ACCESS EXCLUSIVE MODE")
+    op.drop_constraint('event_tags_event_id_event_is_active_fkey', 'event_tags', type_='foreignkey')
+    op.drop_column('event_tags', 'event_is_active')
+    _detach_sequences()
+
+    _create_events('events_plain', partitioned=False)
+    op.execute(f"INSERT INTO events_plain ({EVENT_COLUMNS}) SELECT {EVENT_COLUMNS} FROM events")
+    _create_registrations('registrations_plain', partitioned=False)
+    op.execute("""
+        INSERT INTO registrations_plain (id, user_id, event_id, time_of_registration)
+        SELECT id, user_id, event_id, time_of_registration FROM registrations
+    """)
+
+    op.drop_table('registrations')
+    op.drop_table('events')
+    op.rename_table('events_plain', 'events')
+    op.rename_table('registrations_plain', 'registrations')
+    _attach_sequences()
+
+    op.create_primary_key('events_pkey', 'events', ['event_id'])
+    op.create_index('ix_events_active_date', 'events', ['date', 'event_id'], postgresql_where=sa.text('is_active'))
+    op.create_index('ix_events_archived_date', 'events', ['date', 'event_id'],
+                    postgresql_where=sa.text('NOT is_active'))
+    op.create_index('ix_events_reminder_due', 'events', ['date'],
+                    postgresql_where=sa.text('is_active AND reminder_sent_at IS NULL'))
+    op.create_index('ix_events_search_vector', 'events', ['search_vector'], postgresql_using='gin')
+
+    op.create_primary_key('registrations_pkey', 'registrations', ['id'])
+    op.create_unique_constraint('uq_registrations_user_event', 'registrations', ['user_id', 'event_id'])
+    op.create_index('ix_registrations_event_id', 'registrations', ['event_id'])
+    op.create_foreign_key('registrations_event_id_fkey', 'registrations', 'events', ['event_id'], ['event_id'])
+    op.create_foreign_key('registrations_user_id_fkey', 'registrations', 'users', ['user_id'], ['user_id'])
+
+    op.create_foreign_key('event_tags_event_id_fkey', 'event_tags', 'events', ['event_id'], ['event_id'],
+                          ondelete='CASCADE')
+    op.create_foreign_key('images_event_id_fkey', 'images', 'events', ['event_id'], ['event_id'])
+    op.execute("ANALYZE events, registrations, event_tags")
@@ -0,0 +1,30 @@
+"""ключ лент мероприятий без NULL
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 15:00:00
+
+Ленты идут по (coalesce(date, 'infinity'), event_id): мероприятия без даты стоят как самые
+поздние, и курсор после такой строки больше не обрывает листание. Индекс по (date, event_id)
+заменяется индексом по тому же выражению. events секционирована, а CONCURRENTLY для
+секционированной таблицы не поддерживается, поэтому индекс строится под блокировкой записи;
+в events немного строк, это быстро.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_events_sort_date', 'events', [sa.text("coalesce(date, 'infinity'::timestamp)"), 'event_id'])
+    op.drop_index('ix_events_date', table_name='events')
+
+
+def downgrade() -> None:
+    op.create_index('ix_events_date', 'events', ['date', 'event_id'])
+    op.drop_index('ix_events_sort_date', table_name='events')
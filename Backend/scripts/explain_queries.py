@@ -0,0 +1,221 @@
+"""
+Печатает планы (EXPLAIN) запросов, которые выполняют ручки и фоновые задачи, чтобы проверить,
+что они идут по индексам. Запросы не переписаны вручную: вызываются те же методы DAL, а их SQL
+перехватывается на уровне драйвера. Всё выполняется в одной транзакции, которая в конце
+откатывается, поэтому пишущие запросы (регистрация, outbox) базу не меняют.
+
+На маленькой базе Postgres честно выбирает Seq Scan, поэтому для проверки есть --seed N:
+он добавляет N мероприятий, N пользователей и регистрации в той же откатываемой транзакции
+и делает ANALYZE.
+
+Запуск из папки Backend:
+    python -m scripts.explain_queries [--seed 100000] [--analyze]
+"""
+import argparse
+import asyncio
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.pagination import DEFAULT_PAGE_SIZE
+from db.dals import EventDAL, UserDAL, RegistrationDAL, OutboxDAL, ImageDAL, TagDAL
+from db.models import Event, User, Registration
+from db.session import engine
+from db.settings import OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS, REMINDER_LEAD_HOURS
+
+SEQ_SCAN_RE = re.compile(r"Seq Scan on (\w+)")
+
+
+@dataclass
+class Sample:
+    event_id: int
+    event_date: datetime
+    user_id: int
+    email: str
+
+
+async def seed(session: AsyncSession, count: int):
+    await session.execute(text("""
+        INSERT INTO events (event_name, place, format, date, tags, is_active, registered_count)
+        SELECT 'Explain event ' || g, 'Online', 'Online', now() + (g - :count / 2) * interval '1 hour',
+               'seed', g % 5 <> 0, 0
+        FROM generate_series(1, :count) g
+    """), {"count": count})
+    await session.execute(text("""
+        INSERT INTO users (name, email, hashed_password, role, is_active)
+        SELECT 'Explain user ' || g, 'explain-' || g || '@example.invalid', '-', 'user', true
+        FROM generate_series(1, :count) g
+    """), {"count": count})
+    # Каждый пользователь записан на 5 мероприятий
+    await session.execute(text("""
+        WITH e AS (SELECT array_agg(event_id) AS ids FROM events WHERE event_name LIKE 'Explain event %'),
+             u AS (SELECT user_id, row_number() OVER () AS n FROM users WHERE email LIKE 'explain-%@example.invalid')
+        INSERT INTO registrations (user_id, event_id, event_is_active)
+        SELECT u.user_id, events.event_id, events.is_active
+        FROM u CROSS JOIN e CROSS JOIN generate_series(1, 5) k
+        JOIN events ON events.event_id = e.ids[1 + ((u.n * 7919 + k * 104729) % array_length(e.ids, 1))::int]
+        ON CONFLICT DO NOTHING
+    """))
+    await session.execute(text("""
+        INSERT INTO outbox (recipient, subject, body, status, sent_at)
+        SELECT 'explain-' || g || '@example.invalid', 'seed', 'seed',
+               CASE WHEN g % 100 = 0 THEN 'pending' ELSE 'sent' END,
+               CASE WHEN g % 100 = 0 THEN NULL ELSE now() END
+        FROM generate_series(1, :count) g
+    """), {"count": count})
+    await session.execute(text("INSERT INTO tags (name) VALUES ('seed') ON CONFLICT DO NOTHING"))
+    await session.execute(text("""
+        INSERT INTO event_tags (event_id, event_is_active, tag_id)
+        SELECT events.event_id, events.is_active, tags.tag_id FROM events, tags
+        WHERE events.event_name LIKE 'Explain event %' AND tags.name = 'seed'
+    """))
+    await session.execute(text(
+        "ANALYZE events, users, registrations, outbox, images, image_variants, tags, event_tags"
+    ))
+
+
+async def pick_sample(session: AsyncSession) -> Sample:
+    """Берём самое популярное активное мероприятие и первого пользователя; на пустой базе — заглушки."""
+    event_row = (await session.execute(
+        select(Event.event_id, Event.date).where(Event.is_active == True)
+        .order_by(Event.registered_count.desc()).limit(1)
+    )).first()
+    user_row = (await session.execute(
+        select(User.user_id, User.email).join(Registration, Registration.user_id == User.user_id).limit(1)
+    )).first()
+    return Sample(
+        event_id=event_row.event_id if event_row else 1,
+        event_date=(event_row.date if event_row else None) or datetime.now(),
+        user_id=user_row.user_id if user_row else 1,
+        email=user_row.email if user_row else "user@example.com",
+    )
+
+
+def build_cases(sample: Sample):
+    """(название, корутина) — по одной на ручку или фоновую задачу."""
+
+    async def event_members(session):
+        await session.execute(
+            select(User.name, Registration.time_of_registration)
+            .join(Registration, Registration.user_id == User.user_id)
+            .join(Event, Event.event_id == Registration.event_id)
+            .where(Event.event_id == sample.event_id)
+        )
+
+    async def check_user_registration(session):
+        await session.execute(select(Registration).where(
+            Registration.event_id == sample.event_id, Registration.user_id == sample.user_id
+        ))
+
+    async def confirm_email(session):
+        await session.execute(select(User).where(User.confirmation_token == "0" * 32))
+
+    async def add_member(session):
+        await EventDAL(session).take_seat(sample.event_id)
+        await RegistrationDAL(session).create_registration(sample.user_id, sample.event_id)
+
+    async def cancel_registration(session):
+        await RegistrationDAL(session).delete_registration(sample.user_id, sample.event_id)
+        await EventDAL(session).release_seat(sample.event_id)
+
+    async def reminder_sweep(session):
+        now = datetime.now()
+        await EventDAL(session).claim_due_reminders(now, now + timedelta(hours=REMINDER_LEAD_HOURS))
+        await RegistrationDAL(session).get_member_emails_for_events([sample.event_id])
+
+    async def show_event_image(session):
+        await ImageDAL(session).get_variant(sample.event_id, "card", "webp")
+        await ImageDAL(session).get_image_by_event_id(sample.event_id)
+
+    return [
+        ("auth: user by email", lambda s: UserDAL(s).get_user_by_email(sample.email)),
+        ("GET /confirm/{token}", confirm_email),
+        ("GET /events", lambda s: EventDAL(s).list_events(is_active=True, limit=DEFAULT_PAGE_SIZE + 1)),
+        ("GET /events?cursor=...", lambda s: EventDAL(s).list_events(
+            is_active=True, limit=DEFAULT_PAGE_SIZE + 1, after=(sample.event_date, sample.event_id))),
+        ("GET /archived_events", lambda s: EventDAL(s).list_events(
+            is_active=False, limit=DEFAULT_PAGE_SIZE + 1, descending=True)),
+        ("GET /events?tags=...", lambda s: EventDAL(s).list_events(
+            is_active=True, limit=DEFAULT_PAGE_SIZE + 1, tags=["seed"])),
+        ("GET /tags", lambda s: TagDAL(s).get_active_tag_counts()),
+        ("GET /events/search", lambda s: EventDAL(s).search_events("event", limit=DEFAULT_PAGE_SIZE + 1)),
+        ("GET /events/{id}", lambda s: EventDAL(s).get_event_by_id(sample.event_id)),
+        ("GET /registration_status", lambda s: EventDAL(s).get_seat_statuses(
+            [sample.event_id], sample.user_id)),
+        ("GET /count_members/{id}", lambda s: EventDAL(s).get_registered_count(sample.event_id)),
+        ("GET /event_members/{id}", event_members),
+        ("GET /cabinet, /user_events", lambda s: RegistrationDAL(s).get_user_events(sample.user_id)),
+        ("GET /user_completed_events", lambda s: RegistrationDAL(s).get_user_events(sample.user_id, is_active=False)),
+        ("GET /check_user_registration", check_user_registration),
+        ("GET /all_users", lambda s: UserDAL(s).list_users(limit=DEFAULT_PAGE_SIZE + 1)),
+        ("POST /add_member", add_member),
+        ("DELETE /cancel_registration", cancel_registration),
+        ("GET /show_event_image/{id}", show_event_image),
+        ("outbox dispatcher: claim batch", lambda s: OutboxDAL(s).claim_batch(OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS)),
+        ("reminder sweep", reminder_sweep),
+    ]
+
+
+async def explain_all(seed_count: int, analyze: bool):
+    captured = []
+    capturing = False
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if capturing:
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    explain = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    seq_scans = {}
+    try:
+        async with AsyncSession(engine) as session:
+            if seed_count:
+                await seed(session, seed_count)
+            sample = await pick_sample(session)
+            print(f"sample: event_id={sample.event_id} user_id={sample.user_id}\n")
+            for name, run in build_cases(sample):
+                savepoint = await session.begin_nested()
+                captured.clear()
+                capturing = True
+                try:
+                    await run(session)
+                except Exception as e:
+                    capturing = False
+                    print(f"=== {name}\nfailed: {e}\n")
+                    await savepoint.rollback()
+                    continue
+                capturing = False
+                connection = await session.connection()
+                for statement, parameters in list(captured):
+                    plan = (await connection.exec_driver_sql(explain + statement, parameters)).scalars().all()
+                    print(f"=== {name}\n{statement.strip()}\n")
+                    print("\n".join(plan) + "\n")
+                    for table in SEQ_SCAN_RE.findall("\n".join(plan)):
+                        seq_scans.setdefault(name, set()).add(table)
+                await savepoint.rollback()
+            await session.rollback()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        await engine.dispose()
+
+    if seq_scans:
+        print("Seq Scan found in:")
+        for name, tables in seq_scans.items():
+            print(f"  {name}: {', '.join(sorted(tables))}")
+    else:
+        print("All queries use index scans")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0, help="добавить N тестовых строк во временной транзакции")
+    parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE вместо EXPLAIN")
+    args = parser.parse_args()
+    asyncio.run(explain_all(args.seed, args.analyze))
+
+
+if __name__ == "__main__":
+    main()
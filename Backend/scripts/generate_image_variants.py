@@ -0,0 +1,61 @@
+"""
+Досчитывает уменьшенные варианты (card/detail, webp/jpeg) для картинок, загруженных до их появления.
+Запускать после scripts.migrate_images_to_store; повторный запуск обрабатывает только картинки без вариантов.
+
+Запуск из папки Backend:
+    python -m scripts.generate_image_variants [--batch-size 20]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select, exists
+from starlette.concurrency import run_in_threadpool
+
+from api.image_pipeline import process_image, save_variant_files, InvalidImageError, image_process_pool
+from api.image_store import image_store
+from db.dals import ImageDAL
+from db.models import Image, ImageVariant
+from db.session import async_session
+
+
+async def generate(batch_size: int):
+    processed_count = 0
+    last_id = 0
+    while True:
+        query = (
+            select(Image.id, Image.sha256)
+            .where(Image.id > last_id, ~exists().where(ImageVariant.image_id == Image.id))
+            .order_by(Image.id)
+            .limit(batch_size)
+        )
+        async with async_session() as session:
+            images = (await session.execute(query)).all()
+        if not images:
+            break
+        for image_id, digest in images:
+            last_id = image_id
+            path = image_store.path_for(digest)
+            try:
+                data = await run_in_threadpool(path.read_bytes)
+                processed = await process_image(data)
+            except (FileNotFoundError, InvalidImageError) as e:
+                print(f"image {image_id}: skipped ({e})")
+                continue
+            variants = await run_in_threadpool(save_variant_files, processed)
+            async with async_session() as session:
+                async with session.begin():
+                    await ImageDAL(session).create_variants(image_id, variants)
+            processed_count += 1
+        print(f"processed {processed_count} images")
+    image_process_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(generate(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
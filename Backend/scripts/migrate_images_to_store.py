@@ -0,0 +1,93 @@
+"""
+Переносит картинки мероприятий из колонки images.data в файловое хранилище ImageStore.
+
+Скрипт идемпотентный: добавляет новые колонки, если их ещё нет, переносит блобы пачками
+(каждая пачка — отдельная транзакция, поэтому прерванный перенос можно просто перезапустить)
+и в конце удаляет колонку data. После переноса стоит выполнить VACUUM FULL images.
+
+Запуск из папки Backend, между ревизиями 0003 и 0004:
+    alembic upgrade 0003
+    python -m scripts.migrate_images_to_store [--batch-size 50] [--keep-blobs]
+    alembic upgrade head
+"""
+import argparse
+import asyncio
+from io import BytesIO
+
+from PIL import Image as PillowImage
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from api.image_store import image_store
+from db.session import engine
+
+
+def detect_content_type(data: bytes) -> str:
+    try:
+        img = PillowImage.open(BytesIO(data))
+        return PillowImage.MIME.get(img.format, "application/octet-stream")
+    except Exception:
+        return "application/octet-stream"
+
+
+async def has_data_column(conn) -> bool:
+    res = await conn.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'images' AND column_name = 'data'"
+    ))
+    return res.first() is not None
+
+
+async def migrate(batch_size: int, keep_blobs: bool):
+    async with engine.begin() as conn:
+        if not await has_data_column(conn):
+            print("images.data is already gone, nothing to migrate")
+            return
+        await conn.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64)"))
+        await conn.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS content_type VARCHAR"))
+        await conn.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS size INTEGER"))
+        await conn.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT now()"))
+        await conn.execute(text("ALTER TABLE images ALTER COLUMN data DROP NOT NULL"))
+
+    moved = 0
+    while True:
+        async with engine.begin() as conn:
+            rows = (await conn.execute(
+                text("SELECT id, data FROM images WHERE sha256 IS NULL ORDER BY id LIMIT :limit"),
+                {"limit": batch_size},
+            )).all()
+            if not rows:
+                break
+            for image_id, data in rows:
+                data = bytes(data)
+                digest = await run_in_threadpool(image_store.save, data)
+                # Без --keep-blobs блоб сразу обнуляется, чтобы место в таблице освобождалось по ходу переноса
+                await conn.execute(
+                    text("UPDATE images SET sha256 = :sha256, content_type = :content_type, size = :size, "
+                         "data = CASE WHEN :keep_blobs THEN data END WHERE id = :id"),
+                    {"sha256": digest, "content_type": detect_content_type(data), "size": len(data), "id": image_id,
+                     "keep_blobs": keep_blobs},
+                )
+            moved += len(rows)
+            print(f"moved {moved} images")
+
+    async with engine.begin() as conn:
+        await conn.execute(text("UPDATE images SET created_at = now() WHERE created_at IS NULL"))
+        await conn.execute(text("ALTER TABLE images ALTER COLUMN sha256 SET NOT NULL"))
+        await conn.execute(text("ALTER TABLE images ALTER COLUMN content_type SET NOT NULL"))
+        await conn.execute(text("ALTER TABLE images ALTER COLUMN size SET NOT NULL"))
+        await conn.execute(text("ALTER TABLE images ALTER COLUMN created_at SET NOT NULL"))
+        if not keep_blobs:
+            await conn.execute(text("ALTER TABLE images DROP COLUMN data"))
+    print(f"done, {moved} images moved to {image_store.root}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--keep-blobs", action="store_true", help="не удалять колонку images.data")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.keep_blobs))
+
+
+if __name__ == "__main__":
+    main()
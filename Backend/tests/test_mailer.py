@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from api.mailer import Mailer, SMTPPool
+
+
+class FailingPool(SMTPPool):
+    """Пул, у которого SMTP-сервер недоступен: каждое подключение падает."""
+
+    def __init__(self, size: int):
+        super().__init__(size=size, fake=True, acquire_timeout=1.0)
+        self.connect_attempts = 0
+
+    async def _connect(self):
+        self.connect_attempts += 1
+        await asyncio.sleep(0.01)
+        raise OSError("Connection refused")
+
+
+@pytest.mark.asyncio
+async def test_send_more_than_pool_size_while_connect_fails():
+    pool = FailingPool(size=3)
+    mailer = Mailer(pool, sender="noreply@example.com", concurrency=10, max_retries=2, backoff=0.01)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(mailer.send(f"user{i}@example.com", "Тема", "Текст") for i in range(10))),
+        timeout=5,
+    )
+
+    assert len(results) == 10
+    assert not any(result.ok for result in results)
+    # Каждое письмо само пробовало подключиться, а не ждало соединения, которое не появится
+    assert pool.connect_attempts == 10 * 2
+
+
+@pytest.mark.asyncio
+async def test_discarded_connection_frees_slot():
+    pool = SMTPPool(size=1, fake=True, acquire_timeout=1.0)
+    conn = await pool.acquire()
+    waiter = asyncio.ensure_future(pool.acquire())
+    await asyncio.sleep(0)
+    pool.release(conn, discard=True)
+
+    replacement = await asyncio.wait_for(waiter, timeout=2)
+    assert replacement is not conn
+    pool.release(replacement)
+    await pool.close()
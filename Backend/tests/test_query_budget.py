@@ -0,0 +1,63 @@
+"""
+Число SQL-запросов основных ручек закреплено тестами: рост означает N+1 или лишний запрос
+в горячем пути. Ручки считаются по заголовку X-Query-Count (QUERY_DEBUG), DAL — через assert_max_queries.
+"""
+import pytest
+
+from security import create_access_token
+
+
+def query_count(response) -> int:
+    assert response.status_code == 200, response.text
+    return int(response.headers["x-query-count"])
+
+
+@pytest.fixture
+def cold_caches(client):
+    from api.actions.auth import auth_user_cache
+    from api.response_cache import event_response_cache
+
+    auth_user_cache.clear()
+    event_response_cache.invalidate()
+
+
+def test_events_query_count(client, cold_caches):
+    # Промах кэша: страница и счётчики мест
+    assert query_count(client.get("/events")) == 2
+    # Страница из кэша, каждый раз читаются только счётчики мест
+    assert query_count(client.get("/events")) == 1
+
+
+def test_events_query_count_for_user(client, seeded, cold_caches):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': seeded['email']})}"}
+    # Страница, пользователь при промахе кэша авторизации, счётчики вместе с его записью
+    assert query_count(client.get("/events", headers=headers)) == 3
+    assert query_count(client.get("/events", headers=headers)) == 1
+
+
+def test_cabinet_query_count(client, seeded, cold_caches):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': seeded['email']})}"}
+    response = client.get("/cabinet", headers=headers)
+    # Пользователь при промахе кэша авторизации и все его мероприятия одним запросом
+    assert query_count(response) == 2
+    body = response.json()
+    assert len(body["upcoming_events"]) == 5 and len(body["completed_events"]) == 5
+    assert query_count(client.get("/cabinet", headers=headers)) == 1
+
+
+@pytest.mark.asyncio
+async def test_user_events_single_query(database, seeded):
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from api.query_budget import assert_max_queries, install_query_counter
+    from db.dals import RegistrationDAL
+
+    engine = create_async_engine(database.url.set(drivername="postgresql+asyncpg"))
+    install_query_counter(engine)
+    try:
+        async with AsyncSession(engine) as session:
+            with assert_max_queries(1) as counter:
+                events = await RegistrationDAL(session).get_user_events(seeded["user_id"], is_active=True)
+        assert counter.count == 1
+        assert len(events) == 5
+    finally:
+        await engine.dispose()
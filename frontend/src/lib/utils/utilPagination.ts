@@ -0,0 +1,17 @@
+// Одна страница списка с курсорной пагинацией
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+}
+
+// Загружает страницу списка; cursor — next_cursor предыдущей страницы (null для первой).
+// Следующие страницы запрашиваются по кнопке «Показать ещё», а не все сразу
+export async function fetchPage<T>(url: string, cursor: string | null, init?: RequestInit): Promise<Page<T>> {
+  const separator = url.includes('?') ? '&' : '?';
+  const pageUrl = cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url;
+  const response = await fetch(pageUrl, init);
+  if (!response.ok) {
+    throw new Error(`Ошибка при получении данных: ${response.status}`);
+  }
+  return await response.json();
+}